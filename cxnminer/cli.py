@@ -2,7 +2,9 @@ import base64
 import binascii
 import collections
 import collections.abc
+import contextlib
 import functools
+import heapq
 import itertools
 import json
 import logging
@@ -14,13 +16,17 @@ import os.path
 import pickle
 import random
 
+import bitarray
 import click
 import conllu
+import numpy
 
-from cxnminer.pattern import SNGram, PatternElement
+from cxnminer.columnar import ColumnarPatternSet, ColumnarPatternFeatures
+from cxnminer.pattern import SNGram, PatternElement, PatternFeatures
 from cxnminer.pattern_collection import PatternCollection
 from cxnminer.pattern_encoder import PatternEncoder, Base64Encoder, HuffmanEncoder
-from cxnminer.utils.helpers import factories, open_file, open_json_config, MultiprocessMap
+from cxnminer.pattern_filter import PatternFilter
+from cxnminer.utils.helpers import factories, iter_chunks, iter_join, iter_outer_join, open_file, open_json_config, MultiprocessMap, SortedGroups, IdTable, UnsortedError, sort_file
 
 @click.group()
 @click.pass_context
@@ -93,9 +99,31 @@ def conversion_function(tree, tags):
         return None
 
 
+@functools.lru_cache(maxsize=2**20)
+def decode_element_code(element):
+    """Decode the code of an encoded element (cached per process).
+
+    Returns None if the element is not encoded.
+
+    """
+
+    try:
+        return HuffmanEncoder.to_bitarray(Base64Encoder.b64decode(element))
+    except binascii.Error:
+        return None
+
+def decode_element(element, level, unknowns):
+
+    code = decode_element_code(element)
+    if code is None:
+        ## set encoded_element to unknown
+        code = decode_element_code(unknowns[level])
+
+    return code
+
 def encode_pattern(pattern, token_start, token_end, unknowns):
 
-    current_pattern = b''
+    current_pattern = bitarray.bitarray()
     for element in pattern.get_element_list():
         if not hasattr(element, 'items'):
             ## can be special element (string), or a PatternElement
@@ -107,15 +135,48 @@ def encode_pattern(pattern, token_start, token_end, unknowns):
             ## just a quick fix - np_function needs to be handled differently
             if level == 'deprel':
                 level = 'np_function'
-            try:
-                encoded_element = Base64Encoder.b64decode(element)
-            except binascii.Error:
-                ## set encoded_element to unknown
-                encoded_element = Base64Encoder.b64decode(unknowns[level])
 
-            current_pattern = HuffmanEncoder.combine(current_pattern, encoded_element)
+            current_pattern.extend(decode_element(element, level, unknowns))
+
+    return Base64Encoder.b64encode(HuffmanEncoder.from_bitarray(current_pattern), binary=False)
+
+def has_branches(head):
+
+    return bool(head.children) and (
+        len(head.children) > 1 or any(has_branches(child) for child in head.children))
 
-    return Base64Encoder.b64encode(current_pattern, binary=False)
+def get_encoded_tree_function(word_level, get_code, specials):
+    """Return a function for TokenSNGram.iter_trees that encodes the patterns.
+
+    The codes (as bitarrays) follow the order of SNGram.get_element_list.
+    Together with each code it is returned whether all elements are on the
+    word level.
+
+    """
+
+    def encode_tree(element, children):
+
+        code = get_code(element.form)
+        is_base = element.level == word_level
+
+        if children is None:
+            return code, is_base
+
+        if len(children) == 1:
+            child_code, child_is_base = children[0]
+            return code + child_code, is_base and child_is_base
+
+        code = code + specials[0]
+        for index, (child_code, child_is_base) in enumerate(children):
+            if index > 0:
+                code += specials[1]
+            code += child_code
+            is_base = is_base and child_is_base
+        code += specials[2]
+
+        return code, is_base
+
+    return encode_tree
 
 def pattern_extraction(sentence_tuple, extractor, word_level, token_start, token_end, keep_only_word,
                        logger, skip_unknown, unknowns={}, known=None):
@@ -131,31 +192,52 @@ def pattern_extraction(sentence_tuple, extractor, word_level, token_start, token
     tpatterns = extractor.extract_patterns(sentence)
 
     if skip_unknown:
-        unknown = unknowns.values()
+        unknown = set(unknowns.values())
     else:
-        unknown = []
+        unknown = set()
+
+    ### only keep patterns that consist of given vocabulary entries
+    def keep_element(form, level):
+
+        return form not in unknown and (
+            known is None or form in known.get(level, {}))
+
+    def keep_pattern_element(element):
+
+        return keep_element(element.form, element.level)
+
+    def get_code(element):
+
+        return decode_element(element, None, unknowns)
 
     for tpattern in tpatterns:
 
         this_pattern_list = []
 
-        base_level_pattern = tpattern.get_base_pattern(word_level)
-
         base_pattern_encoded = None
 
         if keep_only_word is None or any([getattr(element, "get", lambda x, y: None)(word_level, None) == keep_only_word for element in tpattern.get_full_pattern().get_element_list()]):
-            for pattern in tpattern.get_pattern_list(frozenset(['lemma', 'upos', 'np_function'])):
-
-                if pattern != base_level_pattern:
-                    ### only keep patterns that consist of given vocabulary entries
-                    if not unknown or not any((getattr(element, "form", None) in unknown for element in pattern.get_element_list())):
-                        if known is None or all(
-                                (getattr(element, "form", element) in known.get(
-                                    getattr(element, "level", "__special__"), {})
-                                 for element in pattern.get_element_list())):
-                            if base_pattern_encoded is None:
-                                base_pattern_encoded = encode_pattern(tpattern.get_full_pattern(), token_start, token_end, unknowns)
-                            this_pattern_list.append((False, encode_pattern(pattern, token_start, token_end, unknowns), base_pattern_encoded))
+            ## special elements are not passed to keep_element, they are only
+            ## contained in patterns with a node that has several children
+            specials = [None, None, None]
+            if has_branches(tpattern.tree):
+                specials = [tpattern.LEFT_BRACKET, tpattern.COMMA, tpattern.RIGHT_BRACKET]
+                if known is not None and not all(element in known.get("__special__", {}) for element in specials):
+                    continue
+                specials = [get_code(element) for element in specials]
+            encode_tree = get_encoded_tree_function(word_level, get_code, specials)
+
+            ## the patterns are encoded directly from the tree, the pattern
+            ## that only consists of elements on the word level is the base pattern
+            for code, is_base in tpattern.iter_trees(frozenset(['lemma', 'upos', 'np_function']),
+                                                     predicate=keep_pattern_element, make_tree=encode_tree):
+
+                if not is_base:
+                    if base_pattern_encoded is None:
+                        base_pattern_encoded = encode_pattern(tpattern.get_full_pattern(), token_start, token_end, unknowns)
+                    this_pattern_list.append((False,
+                                              Base64Encoder.b64encode(HuffmanEncoder.from_bitarray(code), binary=False),
+                                              base_pattern_encoded))
 
 
         if this_pattern_list:
@@ -167,8 +249,18 @@ def pattern_extraction(sentence_tuple, extractor, word_level, token_start, token
         for key, _ in itertools.groupby(sorted(positions, key=lambda x: ",".join(str(x)))):
             pattern_list.append((True, encoded_base_pattern, [sentence_nr + 1, key]))
 
+    cache_info = decode_element_code.cache_info()
+    logger.debug("Code cache of process {}: {} hits, {} misses, hit rate {:.2%}".format(
+        os.getpid(), cache_info.hits, cache_info.misses,
+        cache_info.hits/max(cache_info.hits + cache_info.misses, 1)))
+
     return pattern_list
 
+def write_pattern(pattern, contents, outfile):
+
+    json.dump((pattern, contents), outfile)
+    outfile.write("\n")
+
 @main.command()
 @click.pass_context
 @click.argument('infile')
@@ -180,8 +272,19 @@ def pattern_extraction(sentence_tuple, extractor, word_level, token_start, token
 @click.option('--keep_only_dict_words', is_flag=True)
 @click.option('--skip_unknown', is_flag=True)
 @click.option('--only_base', is_flag=True)
+@click.option('--processes', type=int, default=0)
+@click.option('--chunksize', type=int, default=10)
+@click.option('--aggregate', is_flag=True)
+@click.option('--buffer_size', type=int, default=1024, show_default=True,
+              help="Memory (in MB) used for aggregating patterns.")
+@click.option('--tmpdir')
+@click.option('--sentence_offset', type=int, default=0, show_default=True,
+              help="Added to the sentence ids, e.g. the number of sentences of an existing corpus.")
 def extract_patterns(ctx, infile, outfile_patterns, outfile_base, encoded_dictionaries,
-                     config, keep_only_word, keep_only_dict_words, skip_unknown, only_base):
+                     config, keep_only_word, keep_only_dict_words, skip_unknown, only_base,
+                     processes, chunksize, aggregate, buffer_size, tmpdir, sentence_offset):
+
+    global extract_sentence_patterns
 
     config = open_json_config(config)
     word_level = config["word_level"]
@@ -228,25 +331,65 @@ def extract_patterns(ctx, infile, outfile_patterns, outfile_base, encoded_dictio
 
     extractor = factories.create_from_name('extractor', extractor_config)
 
-    with open_file(infile) as infile:
-        with open_file(outfile_patterns, 'w') as outfile_patterns:
-            with open_file(outfile_base, 'w') as outfile_base:
+    ## the extractor and the vocabulary are shared with the worker processes
+    ## by forking, only the sentences and their patterns are passed between
+    ## the processes
+    def extract_sentence_patterns(sentence_tuple):
+
+        return pattern_extraction(
+            sentence_tuple, extractor=extractor, word_level=word_level,
+            token_start=token_start, token_end=token_end, keep_only_word=keep_only_word,
+            logger=ctx.obj['logger'],
+            skip_unknown=skip_unknown,
+            unknowns=unknown, known=known)
 
-                for sentence_patterns in map(
-                        functools.partial(
-                            pattern_extraction, extractor=extractor, word_level=word_level,
-                            token_start=token_start, token_end=token_end, keep_only_word=keep_only_word,
-                            logger=ctx.obj['logger'],
-                            skip_unknown=skip_unknown,
-                            unknowns=unknown, known=known),
-                        enumerate(conllu.parse_incr(infile))):
+    ## sentences are numbered before they are distributed to the workers and
+    ## the results are collected in order, so the output does not depend on
+    ## the number of processes
+    def extract():
+
+        with open_file(infile) as corpus:
+            with MultiprocessMap(processes, chunksize=chunksize) as m:
+
+                for sentence_patterns in m(
+                        extract_sentence_patterns,
+                        enumerate(conllu.parse_incr(corpus), sentence_offset)):
 
                     for is_base_pattern, pattern, content in sentence_patterns:
                         if not is_base_pattern:
                             if not only_base:
-                                print("\t".join([pattern, str(content)]), file=outfile_patterns)
+                                yield is_base_pattern, pattern, str(content)
                         else:
-                            print("\t".join([pattern, json.dumps(content)]), file=outfile_base)
+                            yield is_base_pattern, pattern, json.dumps(content)
+
+    if aggregate:
+
+        ## collect the patterns and write pattern sets as created by
+        ## convert-pattern-list from the sorted pattern lists
+        buffer_size = buffer_size*1024**2 // 2
+        with SortedGroups(buffer_size, tmpdir) as patterns, SortedGroups(buffer_size, tmpdir) as base_patterns:
+
+            for is_base_pattern, pattern, content in extract():
+                if not is_base_pattern:
+                    patterns.add(pattern, content)
+                else:
+                    base_patterns.add(pattern, content)
+
+            for groups, outfile in [(patterns, outfile_patterns), (base_patterns, outfile_base)]:
+                with open_file(outfile, 'w') as o:
+                    for pattern, contents in groups:
+                        write_pattern(pattern, contents, o)
+
+    else:
+
+        with open_file(outfile_patterns, 'w') as outfile_patterns:
+            with open_file(outfile_base, 'w') as outfile_base:
+
+                for is_base_pattern, pattern, content in extract():
+                    if not is_base_pattern:
+                        print("\t".join([pattern, content]), file=outfile_patterns)
+                    else:
+                        print("\t".join([pattern, content]), file=outfile_base)
 
 
 @main.group()
@@ -306,8 +449,10 @@ def extract_vocabulary(ctx, infile, outfile, config, drop_frequencies):
 @click.argument('dictionaries')
 @click.argument('outfile')
 @click.argument('config')
+@click.option('--binary', is_flag=True)
+@click.option('--canonical', is_flag=True)
 @click.pass_context
-def create_encoder(ctx, dictionaries, outfile, config):
+def create_encoder(ctx, dictionaries, outfile, config, binary, canonical):
 
   with open_file(dictionaries) as dict_file:
     vocabularies = json.load(dict_file)
@@ -319,11 +464,28 @@ def create_encoder(ctx, dictionaries, outfile, config):
 
   pattern_encoder = HuffmanEncoder(vocabularies,
                                    extractor.get_pattern_type(),
-                                   unknown=unknown)
+                                   unknown=unknown,
+                                   canonical=canonical)
 
 
   with open_file(outfile, 'wb') as outfile:
-    pattern_encoder.save(outfile)
+    if binary:
+      pattern_encoder.save_binary(outfile)
+    else:
+      pattern_encoder.save(outfile)
+
+
+@utils.command()
+@click.argument('encoder')
+@click.argument('outfile')
+@click.pass_context
+def convert_encoder(ctx, encoder, outfile):
+
+  with open_file(encoder, 'rb') as encoder_file:
+    pattern_encoder = PatternEncoder.load(encoder_file)
+
+  with open_file(outfile, 'wb') as outfile:
+    pattern_encoder.save_binary(outfile)
 
 
 @utils.command()
@@ -443,6 +605,21 @@ def encode_corpus(ctx, infile, outfile, dictionary, config, processes):
                 print(sentence.serialize(), file=outfile)
 
 
+@utils.command()
+@click.argument('infile')
+@click.argument('outfile')
+@click.option('--buffer_size', type=int, default=100, show_default=True,
+              help="Memory (in MB) used for sorting per process.")
+@click.option('--processes', type=int, default=0)
+@click.option('--tmpdir')
+@click.option('--compress', is_flag=True)
+@click.pass_context
+def sort_patterns(ctx, infile, outfile, buffer_size, processes, tmpdir, compress):
+
+    sort_file(infile, outfile, buffer_size=buffer_size*1024**2,
+              processes=processes, tmpdir=tmpdir, compress=compress)
+
+
 @utils.command()
 @click.argument('infile')
 @click.argument('outfile')
@@ -450,10 +627,6 @@ def encode_corpus(ctx, infile, outfile, dictionary, config, processes):
 @click.pass_context
 def convert_pattern_list(ctx, infile, outfile, remove_hapax):
 
-    def write_pattern(pattern, contents, outfile):
-        json.dump((pattern, contents), outfile)
-        outfile.write("\n")
-
     with open_file(infile) as infile:
         with open_file(outfile, 'w') as outfile:
 
@@ -478,6 +651,232 @@ def convert_pattern_list(ctx, infile, outfile, remove_hapax):
                 write_pattern(current_pattern, contents, outfile)
 
 
+def iter_pattern_set(infile):
+
+    for line in infile:
+        yield json.loads(line)
+
+
+@contextlib.contextmanager
+def sorted_inputs_required():
+
+    try:
+        yield
+    except UnsortedError as error:
+        raise click.UsageError("All inputs have to be pattern sets sorted by pattern (" + str(error) + ").")
+
+
+@utils.command()
+@click.argument('infiles', nargs=-1, required=True)
+@click.argument('outfile')
+@click.pass_context
+def merge_pattern_sets(ctx, infiles, outfile):
+    """Merge pattern sets (or base pattern sets) into one.
+
+    The contents of patterns contained in several pattern sets are merged,
+    the result is the same as for converting the concatenated pattern lists.
+
+    """
+
+    with contextlib.ExitStack() as stack, sorted_inputs_required():
+
+        pattern_sets = [iter_pattern_set(stack.enter_context(open_file(filename))) for filename in infiles]
+
+        with open_file(outfile, 'w') as o:
+            for pattern, contents in iter_outer_join(*pattern_sets):
+                write_pattern(pattern, list(heapq.merge(*[
+                    content for content in contents if content is not None])), o)
+
+
+def update_frequency_stats(stats, contents, new_contents, base_frequencies, new_base_frequencies):
+    """Update frequency and UIF of a pattern for new sentences.
+
+    stats are the statistics and contents the base patterns of the pattern in
+    the existing pattern set (None for new patterns), new_contents the base
+    patterns of the pattern in the new sentences (None if it does not appear
+    there). new_base_frequencies contains the frequencies of the base patterns
+    in the new sentences, base_frequencies the frequencies of these base
+    patterns in the existing base pattern set.
+
+    """
+
+    frequency = 0
+    uif = 0
+    base_ids = set()
+
+    if contents is not None:
+
+        frequency = stats['frequency']
+        uif = stats['uif']
+        base_ids = set(contents)
+
+        for base_id in base_ids:
+            new_base_freq = new_base_frequencies.get(base_id, 0)
+            if new_base_freq > 0:
+                frequency += new_base_freq
+                if base_frequencies.get(base_id, 0) == 1:
+                    uif -= 1
+
+    if new_contents is not None:
+
+        for base_id in set(new_contents) - base_ids:
+            base_freq = base_frequencies.get(base_id, 0) + new_base_frequencies[base_id]
+            frequency += base_freq
+            if base_freq == 1:
+                uif += 1
+
+    return {'frequency': frequency, 'uif': uif}
+
+
+@utils.command()
+@click.argument('patterns')
+@click.argument('stats')
+@click.argument('base_patterns')
+@click.argument('new_patterns')
+@click.argument('new_base_patterns')
+@click.argument('outfile')
+@click.pass_context
+def update_pattern_stats(ctx, patterns, stats, base_patterns, new_patterns, new_base_patterns, outfile):
+    """Update frequency and UIF for the merged pattern sets.
+
+    Takes the existing pattern set with its statistics and base pattern set
+    and the pattern sets of the new sentences. Only the base patterns of the
+    new sentences are kept in memory.
+
+    """
+
+    with open_file(new_base_patterns) as infile:
+        new_base_frequencies = {
+            pattern: len(sentences) for pattern, sentences in iter_pattern_set(infile)}
+
+    with sorted_inputs_required():
+
+        with open_file(base_patterns) as infile:
+            base_frequencies = {
+                pattern: frequency for pattern, frequency in iter_join(
+                    sorted(new_base_frequencies),
+                    ((pattern, len(sentences)) for pattern, sentences in iter_pattern_set(infile)))
+                if frequency is not None
+            }
+
+        with contextlib.ExitStack() as stack:
+
+            pattern_set = iter_join(
+                iter_pattern_set(stack.enter_context(open_file(patterns))),
+                iter_pattern_set(stack.enter_context(open_file(stats))),
+                key=operator.itemgetter(0), required=True)
+            pattern_set = ((pattern, (contents, pattern_stats))
+                           for (pattern, contents), pattern_stats in pattern_set)
+            new_pattern_set = iter_pattern_set(stack.enter_context(open_file(new_patterns)))
+
+            with open_file(outfile, 'w') as o:
+
+                for pattern, (known, new_contents) in iter_outer_join(pattern_set, new_pattern_set):
+
+                    contents, pattern_stats = known if known is not None else (None, None)
+
+                    json.dump((pattern, update_frequency_stats(
+                        pattern_stats, contents, new_contents, base_frequencies, new_base_frequencies)), o)
+                    o.write("\n")
+
+
+def load_id_table(filename):
+
+    if filename is not None and os.path.exists(filename):
+        return IdTable.load(filename)
+    return IdTable()
+
+
+def map_contents(contents, function):
+    """Apply function to the (base) patterns in the contents of a pattern set."""
+
+    if isinstance(contents, dict):
+
+        if 'base_patterns' in contents:
+            contents = dict(contents)
+            contents['base_patterns'] = [
+                [function(base_pattern[0])] + list(base_pattern[1:])
+                if isinstance(base_pattern, (list, tuple)) else function(base_pattern)
+                for base_pattern in contents['base_patterns']
+            ]
+        return contents
+
+    return [function(content) for content in contents]
+
+
+@utils.command()
+@click.argument('infile')
+@click.argument('outfile')
+@click.argument('table')
+@click.option('--contents_table')
+@click.pass_context
+def intern_patterns(ctx, infile, outfile, table, contents_table):
+
+    pattern_table = load_id_table(table)
+    if contents_table is not None:
+        base_pattern_table = load_id_table(contents_table)
+
+    with open_file(infile) as infile:
+        with open_file(outfile, 'w') as outfile:
+
+            for line in infile:
+                pattern, contents = json.loads(line)
+
+                pattern = pattern_table.intern(pattern)
+                if contents_table is not None:
+                    contents = map_contents(contents, base_pattern_table.intern)
+
+                write_pattern(pattern, contents, outfile)
+
+    pattern_table.save(table)
+    if contents_table is not None:
+        base_pattern_table.save(contents_table)
+
+
+@utils.command()
+@click.argument('infile')
+@click.argument('outfile')
+@click.argument('table')
+@click.option('--contents_table')
+@click.pass_context
+def resolve_patterns(ctx, infile, outfile, table, contents_table):
+
+    pattern_table = IdTable.load(table)
+    if contents_table is not None:
+        base_pattern_table = IdTable.load(contents_table)
+
+    with open_file(infile) as infile:
+        with open_file(outfile, 'w') as outfile:
+
+            for line in infile:
+                pattern, contents = json.loads(line)
+
+                pattern = pattern_table.resolve(pattern)
+                if contents_table is not None:
+                    contents = map_contents(contents, base_pattern_table.resolve)
+
+                write_pattern(pattern, contents, outfile)
+
+
+@utils.command()
+@click.argument('infile')
+@click.argument('outfile')
+@click.pass_context
+def convert_pattern_set(ctx, infile, outfile):
+
+    if ColumnarPatternSet.is_columnar(infile):
+        pattern_set = ColumnarPatternSet.load(infile)
+    else:
+        with open_file(infile) as infile:
+            pattern_set = ColumnarPatternSet.from_jsonl(infile)
+
+    if ColumnarPatternSet.is_columnar(outfile):
+        pattern_set.save(outfile)
+    else:
+        with open_file(outfile, 'w') as outfile:
+            pattern_set.write_jsonl(outfile)
+
+
 @utils.command()
 @click.pass_context
 @click.argument('vocabulary')
@@ -523,108 +922,251 @@ def get_vocabulary_probs(ctx, vocabulary, outfile, add_smoothing):
 @click.argument('outfile')
 def get_pattern_type_freq(ctx, infile_patterns, frequency_stats, outfile):
 
-    pattern_types = collections.defaultdict(int)
-
-    number = 0
+    def count_pattern_types(co_sorted):
 
-    stats = {}
+        pattern_types = collections.defaultdict(int)
 
-    with open_file(frequency_stats) as infile:
+        with open_file(frequency_stats) as statsfile:
 
-        for line in infile:
-            pattern, pstats = json.loads(line)
-            stats[pattern] = pstats
-
-    with open_file(infile_patterns, 'rb') as infile:
+            frequencies = ((pattern, stats.get('frequency', 1))
+                           for pattern, stats in (json.loads(line) for line in statsfile))
 
-        while True:
-            try:
-                pattern, decoded_pattern = pickle.load(infile)
+            for number, ((pattern, decoded_pattern), frequency) in enumerate(iter_join(
+                    iter_decoded_patterns(infile_patterns), frequencies, key=operator.itemgetter(0),
+                    co_sorted=co_sorted, default=1), 1):
 
-                number += 1
                 ctx.obj['logger'].info("Pattern " + str(number))
                 pattern_type = decoded_pattern.get_pattern_profile()
 
-                pattern_types[pattern_type] += stats.get(pattern, {}).get('frequency', 1)
-            except EOFError:
-                break
+                pattern_types[pattern_type] += frequency
+
+        return pattern_types
 
+    pattern_types = call_with_join_fallback(ctx, count_pattern_types)
 
     print(len(pattern_types))
     with open_file(outfile, 'w') as o:
         json.dump(pattern_types, o)
 
 
-def get_stats(line, decoded_patterns, known_stats, base_patterns, base_level, pattern_profile_frequency, vocabulary_probs):
+def call_with_join_fallback(ctx, function, *args, **kwargs):
+    """Call function with co_sorted set and again without if the files to join are not sorted."""
+
+    try:
+        return function(*args, co_sorted=True, **kwargs)
+    except UnsortedError as error:
+        ctx.obj['logger'].warning(str(error) + ", joining the files in memory instead.")
+        return function(*args, co_sorted=False, **kwargs)
+
+
+def iter_decoded_patterns(filename):
+    """Iterate over the pairs of patterns and decoded patterns written by decode-patterns.
+
+    The decoded patterns are either pickled patterns or PatternFeatures (one
+    json list per line or columnar if the filename ends with ".npz").
 
-    pattern, base_ids = json.loads(line)
-    base_ids = set(base_ids)
+    """
 
-    stats = {}
-    if known_stats is not None:
-        stats = known_stats.get(pattern)
+    if ColumnarPatternFeatures.is_columnar(filename):
+        yield from ColumnarPatternFeatures.load(filename)
+        return
+
+    with open_file(filename, 'rb') as infile:
+
+        if infile.peek(1)[:1] == b'[':
+
+            for line in infile:
+                pattern, *features = json.loads(line)
+                yield pattern, PatternFeatures.from_list(features)
+
+        else:
+
+            while True:
+                try:
+                    yield pickle.load(infile)
+                except EOFError:
+                    break
+
+
+pattern_decoder = json.JSONDecoder()
+
+def get_pattern_key(line):
+    """Parse only the pattern (the first element) of a line of a pattern set."""
+
+    return pattern_decoder.raw_decode(line, 1)[0]
+
+
+def iter_joined_batches(lines, joined, batch_size, co_sorted=True, required=()):
+    """Join batches of lines of a pattern set with other files.
+
+    joined is a list of iterables of pairs of patterns and values (or None),
+    e.g. decoded patterns or statistics of the patterns, which are joined
+    with iter_join. required contains the indices of the iterables that need
+    a value for every pattern. Yields the batches together with a list
+    containing a dictionary of the values of the patterns in the batch for
+    every iterable (None for None).
+
+    """
+
+    rows = ((get_pattern_key(line), line, ()) for line in lines)
+
+    for index, values in enumerate(joined):
+        if values is not None:
+            rows = ((pattern, line, row_values + (value,))
+                    for (pattern, line, row_values), value
+                    in iter_join(rows, values, key=operator.itemgetter(0), co_sorted=co_sorted,
+                                 required=index in required))
+
+    for batch in iter_chunks(rows, batch_size):
+
+        batch_values = []
+        index = 0
+        for values in joined:
+            if values is None:
+                batch_values.append(None)
+            else:
+                batch_values.append({
+                    pattern: row_values[index]
+                    for pattern, _, row_values in batch if row_values[index] is not None
+                })
+                index += 1
+
+        yield [line for _, line, _ in batch], batch_values
+
+
+def sum_segments(values, offsets):
+    """Sum up the segments values[offsets[i]:offsets[i+1]]."""
+
+    cumulated = numpy.concatenate([numpy.zeros(1, dtype=values.dtype), numpy.cumsum(values)])
+    return cumulated[offsets[1:]] - cumulated[offsets[:-1]]
+
+
+def sum_rows(values, lengths):
+    """Sum up the rows of a ragged array (given as flat values and row lengths).
+
+    The values of each row are added up from left to right in order to get
+    the same results as summing them up one after the other.
+
+    """
+
+    matrix = numpy.zeros((len(lengths), max(lengths, default=0)))
+    matrix[numpy.arange(matrix.shape[1]) < numpy.asarray(lengths)[:, None]] = values
+
+    sums = numpy.zeros(len(lengths))
+    for column in matrix.T:
+        sums += column
+
+    return sums
+
+
+def get_stats_batch(lines, decoded_patterns, known_stats, base_patterns, base_level, pattern_profile_frequency,
+                    vocabulary_probs, log_probs=None):
+    """Compute the statistics for a batch of lines of a pattern set.
+
+    Frequency, UIF and the measures based on the elements of the decoded
+    patterns are computed with NumPy for the whole batch. log_probs is used
+    to cache the log probability per element.
+
+    """
+
+    patterns = []
+    all_stats = []
+    base_frequencies = []
+    base_offsets = [0]
+
+    for line in lines:
+
+        pattern, base_ids = json.loads(line)
+        patterns.append(pattern)
+
+        stats = {}
+        if known_stats is not None:
+            stats = known_stats.get(pattern)
+        all_stats.append(stats)
+
+        if base_patterns is not None:
+            base_frequencies.extend(base_patterns[base_id] for base_id in set(base_ids))
+            base_offsets.append(len(base_frequencies))
 
     if base_patterns is not None:
-        frequency = 0
-        base_hapax = 0
 
-        for base_id in base_ids:
+        base_frequencies = numpy.array(base_frequencies, dtype=numpy.int64)
+        base_offsets = numpy.array(base_offsets)
+        frequencies = sum_segments(base_frequencies, base_offsets).tolist()
+        uifs = sum_segments(base_frequencies == 1, base_offsets).tolist()
 
-            base_freq = base_patterns[base_id]
-            frequency += base_freq
-            if base_freq == 1:
-                base_hapax += 1
-        stats['frequency'] = frequency
-        stats['uif'] = base_hapax
+        for stats, frequency, uif in zip(all_stats, frequencies, uifs):
+            stats['frequency'] = frequency
+            stats['uif'] = uif
 
-    decoded_pattern = None
     if decoded_patterns is not None:
-        decoded_pattern = decoded_patterns.get(pattern, None)
 
-    if decoded_pattern is not None:
+        if log_probs is None:
+            log_probs = {}
 
-        stats['length'] = decoded_pattern.length
+        decoded = []
+        is_base = []
+        element_log_probs = []
+        lengths = []
 
-        if base_level is not None:
+        for index, pattern in enumerate(patterns):
 
-            base_elements = 0
-            non_base_elements = 0
+            decoded_pattern = decoded_patterns.get(pattern, None)
+            if decoded_pattern is None:
+                continue
 
-            for element in decoded_pattern.get_element_list():
-                ## skip meta elements
-                if hasattr(element, "level"):
-                    if element.level == base_level:
-                        base_elements += 1
-                    else:
-                        non_base_elements += 1
+            if not isinstance(decoded_pattern, PatternFeatures):
+                decoded_pattern = PatternFeatures.from_pattern(decoded_pattern)
+            decoded.append((index, decoded_pattern))
 
-            stats['schematicity'] = non_base_elements/(base_elements + non_base_elements)
+            for element in decoded_pattern.elements:
+
+                is_base.append(element[0] == base_level)
+
+                if vocabulary_probs is not None:
+                    try:
+                        element_log_probs.append(log_probs[element])
+                    except KeyError:
+                        level_probs = vocabulary_probs[element[0]]
+                        log_prob = math.log(level_probs[0].get(element[1], level_probs[1]))
+                        log_probs[element] = log_prob
+                        element_log_probs.append(log_prob)
 
-        pattern_type = decoded_pattern.get_pattern_profile()
-        stats["pattern_profile"] = pattern_type
+            lengths.append(len(decoded_pattern.elements))
 
+        if base_level is not None:
+            offsets = numpy.concatenate([[0], numpy.cumsum(lengths, dtype=numpy.int64)])
+            base_elements = sum_segments(numpy.array(is_base, dtype=numpy.int64), offsets)
+            schematicities = ((offsets[1:] - offsets[:-1] - base_elements) / (offsets[1:] - offsets[:-1])).tolist()
         if vocabulary_probs is not None:
+            unigram_log_probs = sum_rows(numpy.array(element_log_probs), lengths).tolist()
+
+        for number, (index, decoded_pattern) in enumerate(decoded):
+
+            stats = all_stats[index]
+            stats['length'] = decoded_pattern.length
 
-            prob = 0
+            if base_level is not None:
+                stats['schematicity'] = schematicities[number]
 
-            for element in decoded_pattern.get_element_list():
-                ## skip meta elements (and unknown?)
-                if hasattr(element, "level"):
-                    level_probs = vocabulary_probs[element.level]
-                    prob += math.log(level_probs[0].get(element.form, level_probs[1]))
+            stats["pattern_profile"] = decoded_pattern.get_pattern_profile()
 
-            stats["log_unigram_probability"] = prob
+            if vocabulary_probs is not None:
+                ## an empty sum is the integer 0
+                stats["log_unigram_probability"] = unigram_log_probs[number] if lengths[number] else 0
 
-    if pattern_profile_frequency is not None and "pattern_profile" in stats and "frequency" in stats:
-        stats["log_pattern_probability"] = math.log(stats["frequency"]/pattern_profile_frequency[stats["pattern_profile"]])
+    for stats in all_stats:
 
-    if "log_pattern_probability" in stats and "log_unigram_probability" in stats:
-        stats["pmi"] = stats["log_pattern_probability"] - stats["log_unigram_probability"]
+        if pattern_profile_frequency is not None and "pattern_profile" in stats and "frequency" in stats:
+            stats["log_pattern_probability"] = math.log(stats["frequency"]/pattern_profile_frequency[stats["pattern_profile"]])
 
-    if "pmi" in stats and "uif" in stats:
-        stats["uif-pmi"] = stats["uif"]*stats["pmi"]
+        if "log_pattern_probability" in stats and "log_unigram_probability" in stats:
+            stats["pmi"] = stats["log_pattern_probability"] - stats["log_unigram_probability"]
 
-    return pattern, stats
+        if "pmi" in stats and "uif" in stats:
+            stats["uif-pmi"] = stats["uif"]*stats["pmi"]
+
+    return list(zip(patterns, all_stats))
 
 @utils.command()
 @click.pass_context
@@ -636,25 +1178,17 @@ def get_stats(line, decoded_patterns, known_stats, base_patterns, base_level, pa
 @click.option('--config')
 @click.option('--vocabulary_probs')
 @click.option('--pattern_profile_frequency')
+@click.option('--batch_size', type=int, default=1000)
+@click.option('--processes', type=int, default=0)
 def add_pattern_stats(ctx, infile_patterns, outfile, known_stats, base_patterns, decoded_patterns, config,
-                      vocabulary_probs, pattern_profile_frequency):
+                      vocabulary_probs, pattern_profile_frequency, batch_size, processes):
+
+    global get_stats_for_batch
 
     base_level = None
     if config is not None:
         base_level = open_json_config(config)['word_level']
 
-    if decoded_patterns is not None:
-        with open_file(decoded_patterns, 'rb') as infile:
-
-            decoded_patterns = {}
-
-            while True:
-                try:
-                    pattern, decoded_pattern = pickle.load(infile)
-                    decoded_patterns[pattern] = decoded_pattern
-                except EOFError:
-                    break
-
     if base_patterns is not None:
         with open_file(base_patterns) as infile:
 
@@ -672,36 +1206,49 @@ def add_pattern_stats(ctx, infile_patterns, outfile, known_stats, base_patterns,
         with open_file(vocabulary_probs, 'r') as infile:
             vocabulary_probs = json.load(infile)
 
-    if known_stats is not None:
+    ## the lookup tables are shared with the worker processes by forking,
+    ## only the lines, the joined values and the statistics are passed
+    ## between the processes
+    log_probs = {}
 
-        with open_file(known_stats) as infile:
+    def get_stats_for_batch(batch):
 
-            known_stats = {}
+        lines, (batch_decoded_patterns, batch_known_stats) = batch
+        return get_stats_batch(lines,
+                               decoded_patterns=batch_decoded_patterns,
+                               known_stats=batch_known_stats,
+                               base_patterns=base_patterns,
+                               base_level=base_level,
+                               pattern_profile_frequency=pattern_profile_frequency,
+                               vocabulary_probs=vocabulary_probs,
+                               log_probs=log_probs)
 
-            for line in infile:
-                pattern, stats = json.loads(line)
-                known_stats[pattern] = stats
+    def write_stats(co_sorted):
 
-    number = 0
-    with open_file(infile_patterns) as infile:
-        with open_file(outfile, 'w') as o:
+        with contextlib.ExitStack() as stack:
 
-            for pattern, stats in map(
-                    functools.partial(get_stats,
-                                      decoded_patterns=decoded_patterns,
-                                      known_stats=known_stats,
-                                      base_patterns=base_patterns,
-                                      base_level=base_level,
-                                      pattern_profile_frequency=pattern_profile_frequency,
-                                      vocabulary_probs=vocabulary_probs
-                    ),
-                    infile):
-
-                number += 1
-                ctx.obj['logger'].info("Pattern " + str(number))
+            infile = stack.enter_context(open_file(infile_patterns))
+            o = stack.enter_context(open_file(outfile, 'w'))
+            m = stack.enter_context(MultiprocessMap(processes, chunksize=1))
 
-                json.dump((pattern, stats), o)
-                o.write("\n")
+            joined = [None, None]
+            if decoded_patterns is not None:
+                joined[0] = stack.enter_context(contextlib.closing(iter_decoded_patterns(decoded_patterns)))
+            if known_stats is not None:
+                joined[1] = (json.loads(line) for line in stack.enter_context(open_file(known_stats)))
+
+            number = 0
+            for batch in m(get_stats_for_batch, iter_joined_batches(infile, joined, batch_size, co_sorted, required=(1,))):
+
+                for pattern, stats in batch:
+
+                    number += 1
+                    ctx.obj['logger'].info("Pattern " + str(number))
+
+                    json.dump((pattern, stats), o)
+                    o.write("\n")
+
+    call_with_join_fallback(ctx, write_stats)
 
 filter_ops = {
     "==": operator.eq,
@@ -709,39 +1256,119 @@ filter_ops = {
     "<": operator.lt
 }
 
+def iter_filtered_lines(infile, statsfile, pattern_filter, co_sorted=True):
+    """Yield the lines of a pattern set whose statistics match pattern_filter.
+
+    The pattern set is joined with the matching patterns from the statistics
+    using iter_join.
+
+    """
+
+    keep = ((pattern, True) for pattern, stats in (json.loads(line) for line in statsfile)
+            if pattern_filter(stats))
+
+    for line, keep_line in iter_join(infile, keep, key=get_pattern_key, co_sorted=co_sorted, default=False):
+        if keep_line:
+            yield line
+
+
+def filter_pattern_set(ctx, patterns, stats, pattern_filter, outfile):
+
+    if not ColumnarPatternSet.is_columnar(patterns) and not ColumnarPatternSet.is_columnar(stats):
+
+        def write_lines(co_sorted):
+            with open_file(patterns) as infile, open_file(stats) as statsfile:
+                with open_file(outfile, 'w') as o:
+                    o.writelines(iter_filtered_lines(infile, statsfile, pattern_filter, co_sorted))
+
+        call_with_join_fallback(ctx, write_lines)
+        return
+
+
+    if ColumnarPatternSet.is_columnar(stats):
+        stats = ColumnarPatternSet.load(stats)
+        try:
+            keep = set(stats.patterns[pattern_filter.evaluate_columnar(stats)].tolist())
+        except ValueError as error:
+            raise click.UsageError(str(error))
+
+    else:
+        keep = set()
+        with open_file(stats) as infile:
+            for line in infile:
+                pattern, stats = json.loads(line)
+                if pattern_filter(stats):
+                    keep.add(pattern)
+
+
+    if ColumnarPatternSet.is_columnar(patterns):
+        pattern_set = ColumnarPatternSet.load(patterns)
+        pattern_set.select(numpy.isin(pattern_set.patterns, list(keep))).save(outfile)
+        return
+
+    with open_file(patterns) as infile:
+        with open_file(outfile, 'w') as o:
+
+            for line in infile:
+
+                pattern, _ = json.loads(line)
+
+                if pattern in keep:
+                    o.write(line)
+
+
 @utils.command()
 @click.pass_context
 @click.argument('patterns')
 @click.argument('stats')
 @click.argument('feature')
-@click.argument('threshold', type=int)
+@click.argument('threshold', type=float)
 @click.argument('outfile')
 @click.option('--operator', 'op', type=click.Choice(tuple(filter_ops.keys())), default=">=")
 def filter_patterns(ctx, patterns, stats, feature, threshold, outfile, op):
 
+    if threshold.is_integer():
+        threshold = int(threshold)
 
-    keep = set()
-    with open_file(stats) as infile:
-        for line in infile:
-            pattern, stats = json.loads(line)
-            if filter_ops[op](stats.get(feature, 0), threshold):
-                keep.add(pattern)
+    filter_pattern_set(ctx, patterns, stats, PatternFilter.from_threshold(feature, op, threshold), outfile)
 
 
-    with open_file(patterns) as infile:
-        with open_file(outfile, 'w') as o:
+@utils.command()
+@click.pass_context
+@click.argument('patterns')
+@click.argument('stats')
+@click.argument('expression')
+@click.argument('outfile')
+def select_patterns(ctx, patterns, stats, expression, outfile):
+    """Keep the patterns whose statistics match an expression.
 
-            for line in infile:
+    EXPRESSION combines comparisons of statistics with numbers, e.g.
+    "frequency >= 2 and (uif >= 1 or length == 3)".
 
-                pattern, _ = json.loads(line)
+    """
+
+    try:
+        pattern_filter = PatternFilter(expression)
+    except ValueError as error:
+        raise click.BadParameter(str(error), param_hint='EXPRESSION')
+
+    filter_pattern_set(ctx, patterns, stats, pattern_filter, outfile)
 
-                if pattern in keep:
-                    o.write(line)
 
-def decode_pattern(line, pattern_encoder):
+def decode_pattern_batch(lines, pattern_encoder, features=False):
 
-    pattern, _ = json.loads(line)
-    return pattern, pattern_encoder.decode(pattern)
+    patterns = [json.loads(line)[0] for line in lines]
+    return decode_interned_pattern_batch(list(zip(patterns, patterns)), pattern_encoder, features)
+
+def decode_interned_pattern_batch(patterns, pattern_encoder, features=False):
+
+    ids, codes = zip(*patterns)
+    decoded_patterns = pattern_encoder.decode_batch(codes)
+
+    if features:
+        decoded_patterns = [PatternFeatures.from_pattern(pattern) for pattern in decoded_patterns]
+
+    return list(zip(ids, decoded_patterns))
 
 @utils.command()
 @click.pass_context
@@ -749,71 +1376,138 @@ def decode_pattern(line, pattern_encoder):
 @click.argument('encoder')
 @click.argument('outfile')
 @click.option('--processes', type=int, default=1)
-def decode_patterns(ctx, infile, encoder, outfile, processes):
+@click.option('--batch_size', type=int, default=1000)
+@click.option('--cache_size', type=int, default=0)
+@click.option('--table')
+@click.option('--features', is_flag=True)
+def decode_patterns(ctx, infile, encoder, outfile, processes, batch_size, cache_size, table, features):
+
+    global decode_batch_with_encoder
 
     with open_file(encoder, 'rb') as encoder_file:
         pattern_encoder = Base64Encoder(PatternEncoder.load(encoder_file), binary=False)
 
+    if cache_size:
+        pattern_encoder.set_cache_size(cache_size)
+
+    if ColumnarPatternFeatures.is_columnar(outfile) and not features:
+        raise click.UsageError("Only features (option --features) can be stored in columnar format.")
+
     with open_file(infile) as infile:
-        with open_file(outfile, 'wb') as o:
 
-            with MultiprocessMap(processes, chunksize=1000) as m:
+        if table is not None:
+            ## patterns are identified by their ids, the codes are looked up here
+            pattern_table = IdTable.load(table)
+            decode_batch = decode_interned_pattern_batch
+            batches = iter_chunks(
+                ((pattern, pattern_table.resolve(pattern))
+                 for pattern in (json.loads(line)[0] for line in infile)),
+                batch_size)
+        else:
+            decode_batch = decode_pattern_batch
+            batches = iter_chunks(infile, batch_size)
+
+        ## the encoder (with its decoding tree and cache) is shared with
+        ## the worker processes by forking, only the batches are passed
+        ## between the processes
+        def decode_batch_with_encoder(batch):
+
+            return decode_batch(batch, pattern_encoder, features)
 
-                for pattern, decoded_pattern in m(
-                        functools.partial(decode_pattern,
-                                          pattern_encoder=pattern_encoder
-                        ),
-                        infile):
+        def iter_decoded():
 
-                    ctx.obj['logger'].info("Pattern")
+            with MultiprocessMap(processes, chunksize=1) as m:
+
+                for batch in m(decode_batch_with_encoder, batches):
+
+                    ctx.obj['logger'].info("Decoded " + str(len(batch)) + " patterns")
+                    yield from batch
+
+        if ColumnarPatternFeatures.is_columnar(outfile):
+            ColumnarPatternFeatures.from_features(iter_decoded()).save(outfile)
+            return
+
+        with open_file(outfile, 'wb') as o:
+
+            for pattern, decoded_pattern in iter_decoded():
+                if features:
+                    o.write(json.dumps([pattern] + decoded_pattern.to_list()).encode('utf-8'))
+                    o.write(b"\n")
+                else:
                     pickle.dump((pattern, decoded_pattern), o)
 
 
-@utils.command()
-@click.pass_context
-@click.argument('patterns_file')
-@click.argument('pattern_stats_file')
-@click.argument('stat')
-@click.argument('n', type=int)
-@click.argument('outfile')
-def get_top_n(ctx, patterns_file, pattern_stats_file, stat, n, outfile):
+def iter_pattern_stats(patterns_file, pattern_stats_file, co_sorted=True):
+    """Join the patterns of a pattern set with their statistics.
 
-    pattern_stats = {}
+    Yields the pattern, its statistics and its content, the files are joined
+    using iter_join. Every pattern needs statistics.
 
-    ## collect patterns that are in the pattern_file
-    with open_file(patterns_file) as infile:
+    """
 
-            for line in infile:
+    with open_file(patterns_file) as infile, open_file(pattern_stats_file) as statsfile:
 
-                pattern, _ = json.loads(line)
-                pattern_stats[pattern] = []
+        for (pattern, content), stats in iter_join(
+                (json.loads(line) for line in infile), (json.loads(line) for line in statsfile),
+                key=operator.itemgetter(0), co_sorted=co_sorted, required=True):
 
-    ## get statistics for these patterns
-    with open_file(pattern_stats_file) as infile:
+            yield pattern, stats, content
 
-        for line in infile:
-            pattern, stats = json.loads(line)
-            if pattern in pattern_stats:
-                pattern_stats[pattern] = stats
 
-    ## get top n patterns
-    patterns = sorted(pattern_stats.items(), key=lambda item: item[1][stat], reverse=True)
-    patterns = {pattern[0]: [rank] for rank, pattern in enumerate(patterns[:n])}
+def get_top_n_lists(patterns, top_n_lists):
+    """Get several top n lists from (pattern, stats, content) in one pass.
 
-    ## add content to the top patterns
-    with open_file(patterns_file) as infile:
+    top_n_lists contains pairs of the names of the stats used for sorting
+    (further stats break ties) and n. Remaining ties are broken by the order
+    of the patterns. Only n patterns per list are kept in a heap.
 
-            for line in infile:
+    """
 
-                pattern, content = json.loads(line)
+    heaps = [[] for _ in top_n_lists]
 
-                if pattern in patterns:
-                    patterns[pattern].append(content)
+    for index, (pattern, stats, content) in enumerate(patterns):
 
-    with open_file(outfile, 'w') as o:
-        for pattern, value in sorted(patterns.items(), key=lambda item: item[1][0]):
-            json.dump([pattern, {'stats': pattern_stats[pattern], 'base_patterns': value[1]}], o)
-            o.write("\n")
+        for heap, (stat_names, n) in zip(heaps, top_n_lists):
+
+            item = (tuple(stats[name] for name in stat_names), -index, pattern, stats, content)
+
+            if len(heap) < n:
+                heapq.heappush(heap, item)
+            elif n > 0 and item[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, item)
+
+    return [
+        [item[2:] for item in sorted(heap, key=lambda item: item[:2], reverse=True)]
+        for heap in heaps
+    ]
+
+
+@utils.command()
+@click.pass_context
+@click.argument('patterns_file')
+@click.argument('pattern_stats_file')
+@click.argument('stat')
+@click.argument('n', type=int)
+@click.argument('outfile')
+@click.option('--top_n', type=(str, int, str), multiple=True,
+              help="Additional list: stat, n and outfile.")
+def get_top_n(ctx, patterns_file, pattern_stats_file, stat, n, outfile, top_n):
+
+    top_n_lists = [(stat, n, outfile)] + list(top_n)
+    top_n_lists = [(stat.split(','), n, outfile) for stat, n, outfile in top_n_lists]
+
+    def get_top_patterns(co_sorted):
+        return get_top_n_lists(
+            iter_pattern_stats(patterns_file, pattern_stats_file, co_sorted),
+            [(stat, n) for stat, n, _ in top_n_lists])
+
+    top_patterns = call_with_join_fallback(ctx, get_top_patterns)
+
+    for patterns, (_, _, outfile) in zip(top_patterns, top_n_lists):
+        with open_file(outfile, 'w') as o:
+            for pattern, stats, content in patterns:
+                json.dump([pattern, {'stats': stats, 'base_patterns': content}], o)
+                o.write("\n")
 
 
 @utils.command()
@@ -834,6 +1528,28 @@ def get_top_n_base_patterns(ctx, patterns_file, base_patterns_file, n, outfile,
             pattern, sentences = json.loads(line)
             base_patterns[pattern] = len(sentences)
 
+    def select_base_patterns(content):
+
+        bp = content['base_patterns']
+        if len(bp) > n:
+            bp = sorted(set(bp), key=lambda pattern: base_patterns[pattern], reverse=True)[:n]
+        return set(bp)
+
+    ## collect the base patterns that are needed for all patterns
+    needed_base_patterns = set()
+    with open_file(patterns_file) as infile:
+        for line in infile:
+            _, content = json.loads(line)
+            needed_base_patterns.update(select_base_patterns(content))
+
+    ## get the sentences of the needed base patterns (and their position) in one pass
+    base_pattern_sentences = {}
+    with open_file(base_patterns_file) as basefile:
+        for position, baseline in enumerate(basefile):
+            bpattern, sentences = json.loads(baseline)
+            if bpattern in needed_base_patterns:
+                base_pattern_sentences[bpattern] = (position, sentences)
+
     bp_example_ids = set()
     with open_file(patterns_file) as infile:
         with open_file(outfile, 'w') as o:
@@ -841,32 +1557,23 @@ def get_top_n_base_patterns(ctx, patterns_file, base_patterns_file, n, outfile,
             for line in infile:
 
                 pattern, content = json.loads(line)
-                bp = content['base_patterns']
-
-                if len(bp) > n:
-                    bp = sorted(set(bp), key=lambda pattern: base_patterns[pattern], reverse=True)[:n]
 
-                bp_set = set(bp)
                 bp_with_examples = []
-                with open_file(base_patterns_file) as basefile:
-
-                    for baseline in basefile:
-                        bpattern, sentences = json.loads(baseline)
-                        if bpattern in bp_set:
-                            examples = [json.loads(sentence) for sentence in sentences]
-                            if len(examples) > n_examples:
-                                examples = random.sample(examples, n_examples)
-                            # I have added 1 to the id
-                            for example in examples:
-                                example[0] = example[0] - 1
-                            bp_with_examples.append((bpattern, examples))
-                            bp_example_ids.update(set([sentence[0] for sentence in examples]))
-
-                            ## stop scanning base pattern file if I have all base patterns
-                            bp_set.remove(bpattern)
-                            if not bp_set:
-                                break
 
+                ## keep the order of the base pattern file
+                for bpattern in sorted(
+                        (bpattern for bpattern in select_base_patterns(content)
+                         if bpattern in base_pattern_sentences),
+                        key=lambda bpattern: base_pattern_sentences[bpattern][0]):
+
+                    examples = [json.loads(sentence) for sentence in base_pattern_sentences[bpattern][1]]
+                    if len(examples) > n_examples:
+                        examples = random.sample(examples, n_examples)
+                    # I have added 1 to the id
+                    for example in examples:
+                        example[0] = example[0] - 1
+                    bp_with_examples.append((bpattern, examples))
+                    bp_example_ids.update(set([sentence[0] for sentence in examples]))
 
                 bp = bp_with_examples
 
@@ -891,7 +1598,11 @@ def get_top_n_base_patterns(ctx, patterns_file, base_patterns_file, n, outfile,
 @click.argument('config')
 @click.option('--string', is_flag=True)
 @click.option('--skip_unknown', is_flag=True)
-def decode_pattern_collection(ctx, infile, encoder, outfile, config, string, skip_unknown):
+@click.option('--cache_size', type=int, default=0)
+@click.option('--table')
+@click.option('--base_table')
+def decode_pattern_collection(ctx, infile, encoder, outfile, config, string, skip_unknown, cache_size,
+                              table, base_table):
 
     config = open_json_config(config)
     word_level = config["word_level"]
@@ -900,13 +1611,19 @@ def decode_pattern_collection(ctx, infile, encoder, outfile, config, string, ski
     with open_file(encoder, 'rb') as encoder_file:
         pattern_encoder = Base64Encoder(PatternEncoder.load(encoder_file), binary=False)
 
+    if cache_size:
+        pattern_encoder.set_cache_size(cache_size)
+
+    pattern_table = IdTable.load(table) if table is not None else IdTable()
+    base_pattern_table = IdTable.load(base_table) if base_table is not None else IdTable()
+
     with open_file(infile) as infile:
         with open_file(outfile, 'w') as o:
 
             for line in infile:
 
                 pattern, content = json.loads(line)
-                decoded_pattern = pattern_encoder.decode(pattern)
+                decoded_pattern = pattern_encoder.decode(pattern_table.resolve(pattern))
 
                 if string:
                     out_pattern = str(decoded_pattern)
@@ -927,7 +1644,7 @@ def decode_pattern_collection(ctx, infile, encoder, outfile, config, string, ski
                             examples = base_pattern[1]
                             base_pattern = base_pattern[0]
 
-                        decoded_pattern = pattern_encoder.decode(base_pattern)
+                        decoded_pattern = pattern_encoder.decode(base_pattern_table.resolve(base_pattern))
 
                         if (not skip_unknown) or (all([element != unknown for element in decoded_pattern.get_element_list()])):
                             if string:
@@ -0,0 +1,273 @@
+import json
+import numbers
+
+import numpy
+
+from cxnminer.pattern import PatternFeatures
+
+
+class ColumnarPatternSet(object):
+    """A pattern set or a set of pattern statistics stored in columns.
+
+    Patterns (and base patterns) are identified by integer ids (see
+    `utils intern-patterns`). The contents of a pattern set are stored as one
+    flat array of base pattern ids with offsets per pattern, i.e. the contents of
+    pattern i are contents[offsets[i]:offsets[i+1]]. Statistics are stored
+    as one column per statistic together with a mask marking the patterns that
+    have a value for this statistic.
+
+    Pattern sets are saved as NumPy archives (.npz).
+
+    """
+
+    suffix = '.npz'
+
+    def __init__(self, patterns, offsets=None, contents=None, stats=None):
+
+        self.patterns = numpy.asarray(patterns, dtype=numpy.int64)
+        self.offsets = None if offsets is None else numpy.asarray(offsets, dtype=numpy.int64)
+        self.contents = None if contents is None else numpy.asarray(contents, dtype=numpy.int64)
+        self.stats = stats if stats is not None else {}
+
+    @classmethod
+    def is_columnar(cls, filename):
+
+        return filename is not None and filename.endswith(cls.suffix)
+
+    def __len__(self):
+
+        return len(self.patterns)
+
+    def get_contents(self, index):
+
+        return self.contents[self.offsets[index]:self.offsets[index + 1]]
+
+    def get_stat(self, name, default=0):
+        """Return the column for a statistic, missing values are set to default."""
+
+        values, mask = self.stats[name]
+        if mask.all():
+            return values
+        return numpy.where(mask, values, default)
+
+    def select(self, keep):
+        """Return a pattern set with the patterns for which keep is True."""
+
+        keep = numpy.asarray(keep, dtype=bool)
+
+        offsets = None
+        contents = None
+        if self.contents is not None:
+            lengths = numpy.diff(self.offsets)[keep]
+            offsets = numpy.concatenate([[0], numpy.cumsum(lengths)])
+            contents = self.contents[numpy.repeat(keep, numpy.diff(self.offsets))]
+
+        stats = {name: (values[keep], mask[keep]) for name, (values, mask) in self.stats.items()}
+
+        return self.__class__(self.patterns[keep], offsets, contents, stats)
+
+    def __iter__(self):
+
+        patterns = self.patterns.tolist()
+
+        if self.contents is not None:
+            contents = self.contents.tolist()
+            offsets = self.offsets.tolist()
+            for index, pattern in enumerate(patterns):
+                yield pattern, contents[offsets[index]:offsets[index + 1]]
+
+        else:
+            columns = [
+                (name, values.tolist(), mask.tolist())
+                for name, (values, mask) in self.stats.items()
+            ]
+            for index, pattern in enumerate(patterns):
+                yield pattern, {
+                    name: values[index] for name, values, mask in columns if mask[index]
+                }
+
+    @classmethod
+    def _to_column(cls, values):
+
+        mask = numpy.array([value is not None for value in values], dtype=bool)
+        present = [value for value in values if value is not None]
+
+        if all(isinstance(value, numbers.Integral) and not isinstance(value, bool) for value in present):
+            dtype = numpy.int64
+            default = 0
+        elif all(isinstance(value, numbers.Real) for value in present):
+            dtype = numpy.float64
+            default = 0.0
+        else:
+            dtype = str
+            default = ''
+
+        return numpy.array([default if value is None else value for value in values], dtype=dtype), mask
+
+    @classmethod
+    def from_jsonl(cls, lines):
+        """Create a columnar pattern set from lines of a pattern set in JSON format."""
+
+        patterns = []
+        offsets = [0]
+        contents = []
+        stats = []
+
+        for line in lines:
+
+            pattern, content = json.loads(line)
+            if not isinstance(pattern, int):
+                raise ValueError("Columnar pattern sets need pattern ids, use intern-patterns first.")
+            patterns.append(pattern)
+
+            if isinstance(content, dict):
+                stats.append(content)
+            else:
+                contents.extend(content)
+                offsets.append(len(contents))
+
+        if stats and len(offsets) > 1:
+            raise ValueError("Cannot mix pattern contents and statistics.")
+
+        if stats or not patterns:
+            names = dict.fromkeys(name for pattern_stats in stats for name in pattern_stats)
+            return cls(patterns, stats={
+                name: cls._to_column([pattern_stats.get(name) for pattern_stats in stats])
+                for name in names
+            })
+
+        if not all(isinstance(content, int) for content in contents):
+            raise ValueError("Columnar pattern sets need base pattern ids, use intern-patterns first.")
+
+        return cls(patterns, offsets, contents)
+
+    def write_jsonl(self, outfile):
+
+        for pattern, content in self:
+            json.dump((pattern, content), outfile)
+            outfile.write("\n")
+
+    def save(self, filename):
+
+        arrays = {'patterns': self.patterns}
+        if self.contents is not None:
+            arrays['offsets'] = self.offsets
+            arrays['contents'] = self.contents
+        for name, (values, mask) in self.stats.items():
+            arrays['stat:' + name] = values
+            arrays['mask:' + name] = mask
+
+        with open(filename, 'wb') as outfile:
+            numpy.savez(outfile, **arrays)
+
+    @classmethod
+    def load(cls, filename):
+
+        with numpy.load(filename) as data:
+
+            stats = {
+                name[len('stat:'):]: (data[name], data['mask:' + name[len('stat:'):]])
+                for name in data.files if name.startswith('stat:')
+            }
+
+            return cls(data['patterns'],
+                       data['offsets'] if 'offsets' in data.files else None,
+                       data['contents'] if 'contents' in data.files else None,
+                       stats)
+
+
+class ColumnarPatternFeatures(object):
+    """The PatternFeatures of decoded patterns stored in columns.
+
+    Contains one column each for the patterns, their lengths and the ids
+    of their pattern profiles. The elements of all patterns are stored as
+    two flat arrays of level ids and form ids with offsets per pattern, i.e.
+    the elements of pattern i are at offsets[i]:offsets[i+1]. The ids refer
+    to the tables profile_table, level_table and form_table.
+
+    Features are saved as NumPy archives (.npz).
+
+    """
+
+    suffix = '.npz'
+
+    def __init__(self, patterns, lengths, profiles, profile_table,
+                 offsets, levels, level_table, forms, form_table):
+
+        self.patterns = numpy.asarray(patterns)
+        self.lengths = numpy.asarray(lengths, dtype=numpy.int64)
+        self.profiles = numpy.asarray(profiles, dtype=numpy.int64)
+        self.profile_table = numpy.asarray(profile_table, dtype=str)
+        self.offsets = numpy.asarray(offsets, dtype=numpy.int64)
+        self.levels = numpy.asarray(levels, dtype=numpy.int64)
+        self.level_table = numpy.asarray(level_table, dtype=str)
+        self.forms = numpy.asarray(forms, dtype=numpy.int64)
+        self.form_table = numpy.asarray(form_table, dtype=str)
+
+    @classmethod
+    def is_columnar(cls, filename):
+
+        return filename is not None and filename.endswith(cls.suffix)
+
+    def __len__(self):
+
+        return len(self.patterns)
+
+    def __iter__(self):
+
+        profile_table = self.profile_table.tolist()
+        level_table = self.level_table.tolist()
+        form_table = self.form_table.tolist()
+
+        profiles = self.profiles.tolist()
+        lengths = self.lengths.tolist()
+        offsets = self.offsets.tolist()
+        elements = [
+            (level_table[level], form_table[form])
+            for level, form in zip(self.levels.tolist(), self.forms.tolist())
+        ]
+
+        for index, pattern in enumerate(self.patterns.tolist()):
+            yield pattern, PatternFeatures(
+                lengths[index], profile_table[profiles[index]],
+                elements[offsets[index]:offsets[index + 1]])
+
+    @classmethod
+    def from_features(cls, features):
+        """Create the columns from pairs of patterns and PatternFeatures."""
+
+        tables = ({}, {}, {})
+        columns = ([], [], [], [0], [], [])
+        patterns, lengths, profiles, offsets, levels, forms = columns
+
+        def get_id(table, value):
+            return table.setdefault(value, len(table))
+
+        for pattern, pattern_features in features:
+
+            patterns.append(pattern)
+            lengths.append(pattern_features.length)
+            profiles.append(get_id(tables[0], pattern_features.profile))
+
+            for level, form in pattern_features.elements:
+                levels.append(get_id(tables[1], level))
+                forms.append(get_id(tables[2], form))
+            offsets.append(len(levels))
+
+        if not all(isinstance(pattern, int) for pattern in patterns):
+            patterns = numpy.array(patterns, dtype=str)
+
+        return cls(patterns, lengths, profiles, list(tables[0]),
+                   offsets, levels, list(tables[1]), forms, list(tables[2]))
+
+    def save(self, filename):
+
+        with open(filename, 'wb') as outfile:
+            numpy.savez(outfile, **vars(self))
+
+    @classmethod
+    def load(cls, filename):
+
+        with numpy.load(filename) as data:
+
+            return cls(**{name: data[name] for name in data.files})
@@ -1,5 +1,4 @@
 import abc
-import itertools
 
 import conllu
 import conllu.parser
@@ -51,12 +50,14 @@ class SyntacticNGramExtractor(PatternExtractor):
         self.right_bracket = right_bracket
         self.comma = comma
 
-    def _add_path(self, path, still_open_paths, patterns):
+    def _add_path(self, tree, size, still_open_paths, patterns):
 
-        if self.max_open_path_size is None or path.length <= self.max_open_path_size:
-            still_open_paths.append(path.tree)
-        if path.length >= self.min_size and path.length <= self.max_size:
-            patterns.append(path)
+        if self.max_open_path_size is None or size <= self.max_open_path_size:
+            still_open_paths.append((tree, size))
+        if size >= self.min_size and size <= self.max_size:
+            patterns.append(TokenSNGram(tree,
+                                        self.left_bracket, self.right_bracket, self.comma,
+                                        length=size))
 
     def _add_special_path(self, tree, still_open_paths, patterns):
 
@@ -64,10 +65,38 @@ class SyntacticNGramExtractor(PatternExtractor):
             special_path = self.special_node_conversion(tree)
             if special_path is not None:
                 special_path.orig_tree = tree
-                self._add_path(TokenSNGram(special_path,
-                                           self.left_bracket, self.right_bracket, self.comma),
+                self._add_path(special_path,
+                               TokenSNGram(special_path).length,
                                still_open_paths, patterns)
 
+    def _get_size_limit(self):
+
+        ## larger subtrees are neither patterns nor kept as open paths
+        if self.max_open_path_size is None:
+            return None
+        return max(self.max_size, self.max_open_path_size)
+
+    def _combine_open_paths(self, open_paths, size, limit, min_sizes, index=0):
+        """Generate the combinations of the children's open paths with their size.
+
+        Combinations that would exceed limit are pruned before they are
+        created, min_sizes contains the minimal size of the remaining children.
+
+        """
+
+        if index == len(open_paths):
+            yield (), size
+            return
+
+        for path, path_size in open_paths[index]:
+
+            if limit is not None and size + path_size + min_sizes[index + 1] > limit:
+                continue
+
+            for paths, combined_size in self._combine_open_paths(
+                    open_paths, size + path_size, limit, min_sizes, index + 1):
+                yield (path,) + paths, combined_size
+
     def _get_bottom_up_subtrees(self, tree):
 
         still_open_paths = []
@@ -76,9 +105,7 @@ class SyntacticNGramExtractor(PatternExtractor):
 
         if not tree.children:
 
-            self._add_path(TokenSNGram(tree,
-                                       self.left_bracket, self.right_bracket, self.comma),
-                           still_open_paths, patterns)
+            self._add_path(tree, 1, still_open_paths, patterns)
             self._add_special_path(tree, still_open_paths, patterns)
 
         else:
@@ -92,12 +119,21 @@ class SyntacticNGramExtractor(PatternExtractor):
                 if self.max_open_path_number is not None and len(open_paths) > self.max_open_path_number:
                     return [], []
 
-            still_open_paths = []
-            for open_path_iter in itertools.product(*open_paths):
-                open_path = TokenSNGram(SNGram.Tree(tree.token, open_path_iter),
-                                        self.left_bracket, self.right_bracket, self.comma)
+            ## there are no subtrees containing all children if one child has no open path
+            if all(open_paths):
+
+                min_sizes = [0]
+                for local_paths in reversed(open_paths):
+                    min_sizes.insert(0, min_sizes[0] + min(size for _, size in local_paths))
+
+                for open_path_iter, size in self._combine_open_paths(
+                        open_paths, 1, self._get_size_limit(), min_sizes):
+
+                    self._add_path(SNGram.Tree(tree.token, open_path_iter), size, still_open_paths, patterns)
+
+                    if self.max_open_path_number is not None and len(still_open_paths) > self.max_open_path_number:
+                        return [], []
 
-                self._add_path(open_path, still_open_paths, patterns)
                 self._add_special_path(tree, still_open_paths, patterns)
 
                 if self.max_open_path_number is not None and len(still_open_paths) > self.max_open_path_number:
@@ -114,9 +150,13 @@ class SyntacticNGramExtractor(PatternExtractor):
         except conllu.parser.ParseException:
             return unique_patterns
 
-        patterns = sorted(self._get_bottom_up_subtrees(tree)[1], key=lambda pattern: str(pattern))
-        for _, g in itertools.groupby(patterns, key=lambda pattern: str(pattern)):
-            unique_patterns.append(next(g))
+        ## keep the first occurrence of each pattern in the order of extraction
+        seen = set()
+        for pattern in self._get_bottom_up_subtrees(tree)[1]:
+            key = pattern.get_key()
+            if key not in seen:
+                seen.add(key)
+                unique_patterns.append(pattern)
 
         return unique_patterns
 
@@ -83,6 +83,65 @@ class PatternElement:
 
         return hash(self.form + '_' + self.level)
 
+class PatternFeatures:
+    """The features of a pattern that are needed for its statistics.
+
+    Contains the length, the pattern profile and the level and form of the
+    elements (without meta elements) of a pattern. Can be used instead of
+    decoded patterns if only these features are needed.
+
+    """
+
+    def __init__(self, length, profile, elements):
+
+        self.length = length
+        self.profile = profile
+        self.elements = elements
+
+    @classmethod
+    def from_pattern(cls, pattern):
+
+        return cls(pattern.length, pattern.get_pattern_profile(), [
+            (element.level, element.form)
+            for element in pattern.get_element_list() if hasattr(element, "level")
+        ])
+
+    def get_pattern_profile(self):
+
+        return self.profile
+
+    def to_list(self):
+
+        return [self.length, self.profile, [list(element) for element in self.elements]]
+
+    @classmethod
+    def from_list(cls, features):
+
+        length, profile, elements = features
+        return cls(length, profile, [tuple(element) for element in elements])
+
+    def __eq__(self, other):
+
+        return (
+            self.__class__ == other.__class__ and
+            self.length == other.length and
+            self.profile == other.profile and
+            self.elements == other.elements
+        )
+
+
+def _get_hashable(value):
+    """Convert an element of a pattern into a hashable value."""
+
+    if hasattr(value, 'items'):
+        return ('__token__', tuple((key, _get_hashable(item)) for key, item in value.items()))
+    elif isinstance(value, PatternElement):
+        return ('__element__', value.form, value.level, value.order_id)
+    elif isinstance(value, (list, tuple)):
+        return tuple(_get_hashable(item) for item in value)
+    else:
+        return value
+
 class SNGram(Pattern):
     """A syntactic n-gram is a subtree of a syntax tree with size n."""
 
@@ -110,10 +169,12 @@ class SNGram(Pattern):
                 self._add_tree_length(child)
 
     def __init__(self, tree,
-                 left_bracket=None, right_bracket=None, comma=None):
+                 left_bracket=None, right_bracket=None, comma=None, length=None):
 
         self.tree = tree
-        self._length = None
+        ## the length can be given if it is already known, e.g. during extraction
+        self._length = length
+        self._key = None
 
         if left_bracket is not None:
             self.LEFT_BRACKET = left_bracket
@@ -129,6 +190,13 @@ class SNGram(Pattern):
             self.tree == other.tree
         )
 
+    def __getstate__(self):
+
+        ## the key is only cached, it is not part of the pickled pattern
+        state = self.__dict__.copy()
+        state.pop('_key', None)
+        return state
+
     @property
     def length(self):
 
@@ -138,6 +206,26 @@ class SNGram(Pattern):
 
         return super().length
 
+    def _get_tree_key(self, head):
+
+        if head.children:
+            return (_get_hashable(head.token), tuple(self._get_tree_key(child) for child in head.children))
+        else:
+            return (_get_hashable(head.token), ())
+
+    def get_key(self):
+        """Return a hashable representation of the structure of the pattern.
+
+        Patterns with the same key have the same string representation.
+
+        """
+
+        ## pickled patterns do not have the attribute
+        if getattr(self, '_key', None) is None:
+            self._key = self._get_tree_key(self.tree)
+
+        return self._key
+
     LEFT_BRACKET = "["
     RIGHT_BRACKET = "]"
     COMMA = ","
@@ -335,10 +423,61 @@ class TokenSNGram(SNGram, TokenPattern):
 
         return trees
 
+    def _iter_children(self, children, features, predicate, make_tree, index=0):
+
+        if index == len(children):
+            yield ()
+            return
+
+        ## the trees of the following children are generated again for each tree
+        ## instead of storing them in order to keep memory usage flat
+        for tree in self._iter_tree(children[index], features, predicate, make_tree):
+            for rest in self._iter_children(children, features, predicate, make_tree, index + 1):
+                yield (tree,) + rest
+
+    def _iter_tree(self, head, features, predicate, make_tree):
+
+        for feature in features:
+
+            if feature in head.token:
+
+                element = PatternElement(head.token[feature], feature, order_id=head.token.get('id', None))
+                if predicate is not None and not predicate(element):
+                    continue
+
+                if head.children:
+                    for children in self._iter_children(head.children, features, predicate, make_tree):
+                        yield make_tree(element, children)
+                else:
+                    yield make_tree(element, None)
+
+    def iter_trees(self, features=frozenset(['form']), predicate=None, make_tree=SNGram.Tree):
+        """Generate the trees of the patterns of get_pattern_list lazily.
+
+        If predicate is given, it is called with each PatternElement and all
+        patterns containing an element for which it returns False are skipped.
+        make_tree is called with the PatternElement of a node and a tuple of
+        the results for its children (None for leaves) and creates the result
+        for the node, e.g. an encoded pattern instead of a tree.
+
+        """
+
+        return self._iter_tree(self.tree, features, predicate, make_tree)
+
+    def iter_pattern_list(self, features=frozenset(['form']), predicate=None):
+        """Generate the patterns of get_pattern_list lazily.
+
+        If predicate is given, it is called with each PatternElement and all
+        patterns containing an element for which it returns False are skipped.
+
+        """
+
+        for tree in self.iter_trees(features, predicate):
+            yield SNGram(tree, self.LEFT_BRACKET, self.RIGHT_BRACKET, self.COMMA, length=self._length)
+
     def get_pattern_list(self, features=frozenset(['form'])):
 
-        return [SNGram(tree, self.LEFT_BRACKET, self.RIGHT_BRACKET, self.COMMA)
-                for tree in self._map_tree(self.tree, features)]
+        return list(self.iter_pattern_list(features))
 
     def get_base_pattern(self, feature='form'):
 
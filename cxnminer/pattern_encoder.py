@@ -1,10 +1,16 @@
 import abc
 import base64
+import collections
+import importlib
+import io
 import math
+import mmap
 import pickle
+import struct
 
 import bitarray
 import bitarray.util
+import numpy
 
 from cxnminer.pattern import PatternElement
 
@@ -12,6 +18,47 @@ class EncodeError(ValueError):
 
     pass
 
+
+## binary format for HuffmanEncoder (see HuffmanEncoder.save_binary)
+BINARY_MAGIC = b'CXNMINER-HUFFMAN'
+BINARY_VERSION = 1
+
+def _write_bytes(file_, bytes_):
+
+    file_.write(struct.pack('<I', len(bytes_)))
+    file_.write(bytes_)
+
+def _read_bytes(data, offset):
+
+    length, = struct.unpack_from('<I', data, offset)
+    offset += 4
+    return bytes(data[offset:offset + length]), offset + length
+
+## flags of the binary format
+BINARY_CANONICAL = 1
+
+def _canonical_codes(keys, lengths):
+    """Assign canonical Huffman codes to keys given their code lengths.
+
+    The keys are sorted by code length, keys with the same length keep
+    their order. The codes are returned in the order of keys.
+
+    """
+
+    codes = {}
+    code = 0
+    previous_length = 0
+    for index in sorted(range(len(keys)), key=lambda index: lengths[index]):
+
+        length = lengths[index]
+        code <<= length - previous_length
+        previous_length = length
+
+        codes[index] = bitarray.util.int2ba(code, length=length) if length else bitarray.bitarray()
+        code += 1
+
+    return {keys[index]: codes[index] for index in range(len(keys))}
+
 class PatternEncoder(metaclass=abc.ABCMeta):
 
     token_start = "__TOKEN_START__"
@@ -26,9 +73,27 @@ class PatternEncoder(metaclass=abc.ABCMeta):
         pass # pragma: no cover
 
     @abc.abstractmethod
-    def decode(self, encoded_pattern):
+    def _decode(self, encoded_pattern):
         pass # pragma: no cover
 
+    def decode(self, encoded_pattern):
+
+        decode_cache = getattr(self, '_decode_cache', None)
+        if decode_cache is None:
+            return self._decode(encoded_pattern)
+
+        try:
+            decode_cache.move_to_end(encoded_pattern)
+            return decode_cache[encoded_pattern]
+        except KeyError:
+            pattern = self._decode(encoded_pattern)
+
+            decode_cache[encoded_pattern] = pattern
+            if len(decode_cache) > self.cache_size:
+                decode_cache.popitem(last=False)
+
+            return pattern
+
     @abc.abstractmethod
     def get_levels(self):
         pass # pragma: no cover
@@ -37,6 +102,34 @@ class PatternEncoder(metaclass=abc.ABCMeta):
     def append(self, encoded_pattern, encoded_item):
         pass # pragma: no cover
 
+    def encode_batch(self, patterns):
+        """Encode an iterable of patterns, returns a list of encoded patterns."""
+
+        return [self.encode(pattern) for pattern in patterns]
+
+    def decode_batch(self, encoded_patterns):
+        """Decode an iterable of encoded patterns, returns a list of patterns."""
+
+        return [self.decode(encoded_pattern) for encoded_pattern in encoded_patterns]
+
+    def set_cache_size(self, cache_size):
+        """Cache up to cache_size decoded patterns (0 disables the cache).
+
+        Cached patterns are shared between calls to decode and must not be
+        changed.
+
+        """
+
+        self.cache_size = cache_size
+        self._decode_cache = collections.OrderedDict() if cache_size > 0 else None
+
+    def __getstate__(self):
+
+        ## cached patterns are not saved
+        state = self.__dict__.copy()
+        if state.get('_decode_cache') is not None:
+            state['_decode_cache'] = collections.OrderedDict()
+        return state
 
     def save(self, file_):
 
@@ -50,6 +143,12 @@ class PatternEncoder(metaclass=abc.ABCMeta):
     @classmethod
     def load(cls, file_):
 
+        ## encoders saved in the binary format start with a magic string
+        position = file_.tell()
+        if file_.read(len(BINARY_MAGIC)) == BINARY_MAGIC:
+            return HuffmanEncoder._load_binary(file_)
+        file_.seek(position)
+
         cls_ = cls.get_saved_encoder_class(file_)
         return cls_._load(file_)
 
@@ -133,10 +232,22 @@ class Base64Encoder(PatternEncoder):
 
         return self.b64encode(self.encoder.encode(pattern), self.binary)
 
-    def decode(self, encoded_pattern):
+    def _decode(self, encoded_pattern):
 
         return self.encoder.decode(self.b64decode(encoded_pattern))
 
+    def encode_batch(self, patterns):
+
+        return [self.b64encode(encoded, self.binary) for encoded in self.encoder.encode_batch(patterns)]
+
+    def decode_batch(self, encoded_patterns):
+
+        return self.encoder.decode_batch([self.b64decode(encoded) for encoded in encoded_patterns])
+
+    def set_cache_size(self, cache_size):
+
+        self.encoder.set_cache_size(cache_size)
+
     def append(self, encoded_pattern, encoded_item):
 
         return self.b64encode(
@@ -210,64 +321,62 @@ class BitEncoder(PatternEncoder):
     def get_levels(self):
         return set(self.level_offsets.keys())
 
-    def _get_word_for_id(self, word_id):
-
-        if not hasattr(self, '_ids_2_words'):
-
-            self._ids_2_words = {}
-            for level in self.dictionaries.keys():
+    def _get_token_ids(self):
 
-                for word, id_ in self.dictionaries[level].items():
-                    self._ids_2_words[id_ + self.level_offsets[level]] = (word , level)
+        token_start_id = self.special_offset + len(self.special_characters)
+        return token_start_id, token_start_id + 1
 
-                if self.unknown is not None:
-                    self._ids_2_words[id_ + 1 + self.level_offsets[level]] = (self.unknown, level)
+    def _get_dtype(self):
 
-            for id_, word in enumerate(self.special_characters):
-                self._ids_2_words[id_ + self.special_offset] = (word, None)
+        return numpy.uint16 if self.element_size <= 16 else numpy.uint32
 
-        return self._ids_2_words[word_id]
+    def _get_ids(self, item):
+        """Return the ids of an item (a token is encoded by several ids)."""
 
-    def encode_item(self, item):
-
-        code = 0
+        token_start_id, token_end_id = self._get_token_ids()
 
         if item == self.token_start:
 
-            code = self.special_offset + len(self.special_characters)
+            return [token_start_id]
 
         elif item == self.token_end:
 
-            code = self.special_offset + len(self.special_characters) + 1
+            return [token_end_id]
 
-        else:
+        try:
+            return [self.special_characters.index(item) + self.special_offset]
+
+        except ValueError:
 
             try:
-                code = self.special_characters.index(item) + self.special_offset
+                return [self.dictionaries[item.level][item.form] + self.level_offsets[item.level]]
 
-            except ValueError:
+            except AttributeError:
 
-                try:
-                    code = self.dictionaries[item.level][item.form] + self.level_offsets[item.level]
+                ## it is a token - so encode this
+                return [token_start_id] + [
+                    self._get_ids(PatternElement(value, level))[0] for level, value in item.items()
+                ] + [token_end_id]
 
-                except AttributeError:
+            except KeyError:
 
-                    ## it is a token - so encode this
-                    return self._encode(
-                        [self.token_start] +
-                        [PatternElement(value, level) for level, value in item.items()] +
-                        [self.token_end]
-                    )
+                if self.unknown is not None:
+                    return [len(self.dictionaries[item.level]) + self.level_offsets[item.level]]
+                else:
+                    raise EncodeError("Element not in dictionary: " + str(item))
 
-                except KeyError:
+    def _pack_ids(self, ids):
 
-                    if self.unknown is not None:
-                        code = len(self.dictionaries[item.level]) + self.level_offsets[item.level]
-                    else:
-                        raise EncodeError("Element not in dictionary: " + str(item))
+        code = 0
+        for id_ in ids:
+            code = code << self.element_size | id_
 
         return self._int_2_bytes(code)
 
+    def encode_item(self, item):
+
+        return self._pack_ids(self._get_ids(item))
+
     def append(self, encoded_pattern, encoded_item):
 
         encoded_pattern = self._bytes_2_int(encoded_pattern)
@@ -278,57 +387,161 @@ class BitEncoder(PatternEncoder):
 
     def _encode(self, pattern):
 
-        code = b''
-
-        for element in pattern:
-            code = self.append(code, self.encode_item(element))
-
-        return code
+        return self._pack_ids([id_ for element in pattern for id_ in self._get_ids(element)])
 
     def encode(self, pattern):
 
         return(self._encode(pattern.get_element_list()))
 
+    def encode_ids(self, pattern):
+        """Return the element ids of a pattern as a NumPy array."""
 
-    def decode(self, encoded_pattern):
+        return numpy.array(
+            [id_ for element in pattern.get_element_list() for id_ in self._get_ids(element)],
+            dtype=self._get_dtype())
 
-        encoded_pattern = self._bytes_2_int(encoded_pattern)
+    def encode_batch(self, patterns):
+
+        return self.from_id_matrix(self.to_padded_id_matrix(
+            [self.encode_ids(pattern) for pattern in patterns]))
+
+    def to_padded_id_matrix(self, id_arrays):
+        """Combine arrays of element ids into a matrix, padded with 0 (which is no valid id)."""
+
+        width = max((len(ids) for ids in id_arrays), default=0)
+        matrix = numpy.zeros((len(id_arrays), width), dtype=self._get_dtype())
+        for row, ids in zip(matrix, id_arrays):
+            row[:len(ids)] = ids
+
+        return matrix
+
+    def to_id_matrix(self, encoded_patterns):
+        """Unpack encoded patterns into a matrix of element ids.
+
+        Each row contains the ids of one pattern, padded with 0.
+
+        """
+
+        codes = [self._bytes_2_int(encoded_pattern) for encoded_pattern in encoded_patterns]
+        lengths = [-(-code.bit_length() // self.element_size) for code in codes]
+        width = max(lengths, default=0)
+
+        number_of_bits = width * self.element_size
+        number_of_bytes = (number_of_bits + 7) // 8
+
+        ## align all patterns at the first element
+        buffer = b''.join(
+            (code << (width - length) * self.element_size).to_bytes(number_of_bytes, byteorder='big')
+            for code, length in zip(codes, lengths))
+
+        bits = numpy.unpackbits(
+            numpy.frombuffer(buffer, dtype=numpy.uint8).reshape(len(codes), number_of_bytes), axis=1)
+        bits = bits[:, number_of_bytes * 8 - number_of_bits:].reshape(len(codes), width, self.element_size)
+
+        weights = numpy.left_shift(1, numpy.arange(self.element_size - 1, -1, -1, dtype=numpy.uint32))
+        return bits.dot(weights).astype(self._get_dtype())
+
+    def from_id_matrix(self, id_matrix):
+        """Pack a matrix of element ids (padded with 0) into encoded patterns."""
+
+        id_matrix = numpy.asarray(id_matrix, dtype=numpy.uint32)
+        rows, width = id_matrix.shape
+        number_of_bits = width * self.element_size
+        padding = -number_of_bits % 8
+
+        shifts = numpy.arange(self.element_size - 1, -1, -1, dtype=numpy.uint32)
+        bits = ((id_matrix[:, :, None] >> shifts) & 1).astype(numpy.uint8).reshape(rows, number_of_bits)
+        bits = numpy.concatenate([numpy.zeros((rows, padding), dtype=numpy.uint8), bits], axis=1)
+        packed = numpy.packbits(bits, axis=1)
+
+        lengths = numpy.count_nonzero(id_matrix, axis=1)
+        return [
+            self._int_2_bytes(int.from_bytes(row.tobytes(), byteorder='big') >> (width - length) * self.element_size)
+            for row, length in zip(packed, lengths.tolist())
+        ]
+
+    def __getstate__(self):
+
+        ## the lookup list for decoding is rebuilt when needed
+        state = super().__getstate__()
+        state.pop('_id_elements', None)
+        return state
+
+    def _get_id_elements(self):
+
+        if getattr(self, '_id_elements', None) is None:
+
+            id_elements = [None] * (self._get_token_ids()[1] + 1)
+            for level in self.dictionaries.keys():
+
+                for word, id_ in self.dictionaries[level].items():
+                    id_elements[id_ + self.level_offsets[level]] = PatternElement(word, level)
+
+                if self.unknown is not None:
+                    id_elements[len(self.dictionaries[level]) + self.level_offsets[level]] = PatternElement(
+                        self.unknown, level)
+
+            for id_, word in enumerate(self.special_characters):
+                id_elements[id_ + self.special_offset] = word
+
+            self._id_elements = id_elements
+
+        return self._id_elements
+
+    def decode_ids(self, ids):
+        """Decode a sequence of element ids (trailing 0's are ignored)."""
+
+        id_elements = self._get_id_elements()
+        token_start_id, token_end_id = self._get_token_ids()
 
         pattern = []
-        element_size_int = 2**self.element_size - 1
+        current_token = None
 
-        in_token = False
+        for id_ in ids:
 
-        while encoded_pattern != 0:
-            element_id = int(encoded_pattern & element_size_int)
-            try:
-                word, level = self._get_word_for_id(element_id)
-                if in_token:
-                    current_token[level] = word
-                else:
-                    if level is not None:
-                        pattern.append(PatternElement(word, level))
-                    else:
-                        pattern.append(word)
-
-            except:
-                ## end of token - treat as start as pattern is reversed
-                if element_id == len(self._ids_2_words) + 2:
-                    in_token = True
-                    current_token = {}
-                ## start of token - treat as start as pattern is reversed
-                elif element_id == len(self._ids_2_words) + 1:
-                    in_token = False
-                    pattern.append(current_token)
+            if id_ == 0:
+                break
 
-                else:
-                    raise ValueError("Cannot decode pattern, unknown key " + str(element_id))
+            if id_ == token_start_id:
+                current_token = {}
+            elif id_ == token_end_id:
+                pattern.append(current_token)
+                current_token = None
+            else:
+
+                element = id_elements[id_] if id_ < len(id_elements) else None
+                if element is None:
+                    raise ValueError("Cannot decode pattern, unknown key " + str(id_))
 
-            encoded_pattern = encoded_pattern >> self.element_size
+                if current_token is not None:
+                    current_token[element.level] = element.form
+                else:
+                    pattern.append(element)
 
-        pattern.reverse()
         return self.pattern_type.from_element_list(pattern)
 
+    def _unpack_ids(self, encoded_pattern):
+        """Return the element ids of an encoded pattern as a list."""
+
+        code = self._bytes_2_int(encoded_pattern)
+        mask = (1 << self.element_size) - 1
+
+        ids = []
+        while code:
+            ids.append(code & mask)
+            code >>= self.element_size
+        ids.reverse()
+
+        return ids
+
+    def _decode(self, encoded_pattern):
+
+        return self.decode_ids(self._unpack_ids(encoded_pattern))
+
+    def decode_batch(self, encoded_patterns):
+
+        return [self.decode_ids(ids) for ids in self.to_id_matrix(list(encoded_patterns)).tolist()]
+
 
 class HuffmanEncoder(CombinablePatternEncoder):
 
@@ -339,7 +552,8 @@ class HuffmanEncoder(CombinablePatternEncoder):
     # leading 0's
     prefix = bitarray.bitarray('1')
 
-    def __init__(self, frequency_dictionaries, pattern_type, special_weight=1, unknown=None):
+    def __init__(self, frequency_dictionaries, pattern_type, special_weight=1, unknown=None,
+                 canonical=False):
 
         self.pattern_type = pattern_type
 
@@ -369,19 +583,93 @@ class HuffmanEncoder(CombinablePatternEncoder):
         huffman_freq_dict[self.token_end] = max(max_freq, special_frequency)
 
         self.huffman_dict = bitarray.util.huffman_code(huffman_freq_dict)
+        if canonical:
+            self.huffman_dict = self._get_canonical_dict()
+
+        self._decodetree = None
+        self.set_cache_size(0)
+
+    def __getstate__(self):
+
+        ## the decoding tree cannot be pickled, it is rebuilt when needed
+        state = super().__getstate__()
+        state['_decodetree'] = None
+        return state
+
+    def _get_tables(self):
+        """Group the elements and their codes by level (None for special elements)."""
+
+        tables = collections.OrderedDict()
+        for key, code in self.huffman_dict.items():
+
+            level = getattr(key, 'level', None)
+            tables.setdefault(level, ([], []))
+            tables[level][0].append(key)
+            tables[level][1].append(code)
+
+        return tables
+
+    def _get_canonical_dict(self):
+        """Return canonical codes with the same lengths as the current codes."""
+
+        keys = []
+        lengths = []
+        for level_keys, level_codes in self._get_tables().values():
+            keys.extend(level_keys)
+            lengths.extend(len(code) for code in level_codes)
+
+        return _canonical_codes(keys, lengths)
+
+    def is_canonical(self):
+        """Check whether the encoder uses canonical Huffman codes."""
+
+        return self._get_canonical_dict() == self.huffman_dict
+
+    def _get_decodetree(self):
+
+        if self._decodetree is None:
+            self._decodetree = bitarray.decodetree(self.huffman_dict)
+        return self._decodetree
 
     def get_levels(self):
         return self.levels
 
+    @classmethod
+    def to_bitarray(cls, encoded):
+        """Convert a combinable code into a bitarray."""
+
+        return cls._bytes_2_bitarray(encoded)
+
+    @classmethod
+    def from_bitarray(cls, bitarray_):
+        """Convert a bitarray into a combinable code."""
+
+        return cls._bitarray_2_bytes(bitarray_)
+
+    ## the conversions work on the bits directly and yield the same results as
+    ## converting the bitarray (with prefix) to an integer stored in little endian
+
     @classmethod
     def _bytes_2_bitarray(cls, bytes_):
 
-        return bitarray.util.int2ba(cls._bytes_2_int(bytes_))[len(cls.prefix):]
+        code = bitarray.bitarray(endian='big')
+        code.frombytes(bytes_[::-1])
+
+        try:
+            ## skip the padding and the prefix
+            return code[code.index(1) + len(cls.prefix):]
+        except ValueError:
+            return bitarray.bitarray()
 
     @classmethod
     def _bitarray_2_bytes(cls, bitarray_):
 
-        return cls._int_2_bytes(bitarray.util.ba2int(cls.prefix + bitarray_))
+        code = bitarray.bitarray((-(len(bitarray_) + len(cls.prefix))) % 8, endian='big')
+        code.setall(0)
+        code.extend(cls.prefix)
+        code.extend(bitarray_)
+
+        return code.tobytes()[::-1]
 
     def _encode_to_bitarray(self, pattern):
 
@@ -424,10 +712,10 @@ class HuffmanEncoder(CombinablePatternEncoder):
         return self._encode(pattern.get_element_list())
 
 
-    def decode(self, encoded_pattern):
+    def _decode(self, encoded_pattern):
 
         encoded = self._bytes_2_bitarray(encoded_pattern)
-        flat_pattern = encoded.decode(self.huffman_dict)
+        flat_pattern = encoded.decode(self._get_decodetree())
 
         pattern = []
         in_token = False
@@ -455,10 +743,18 @@ class HuffmanEncoder(CombinablePatternEncoder):
     @classmethod
     def combine(cls, encoded_pattern, encoded_item):
 
-        encoded = cls._bytes_2_bitarray(encoded_pattern)
-        encoded.extend(cls._bytes_2_bitarray(encoded_item))
+        return cls.combine_many([encoded_pattern, encoded_item])
 
-        return cls._bitarray_2_bytes(encoded)
+    @classmethod
+    def combine_many(cls, encoded_items):
+
+        return cls.builder().extend(encoded_items).to_bytes()
+
+    @classmethod
+    def builder(cls, encoded_pattern=b''):
+        """Return a HuffmanCodeBuilder to append several codes to encoded_pattern."""
+
+        return HuffmanCodeBuilder(encoded_pattern, cls)
 
 
     def _save(self, file_):
@@ -486,4 +782,161 @@ class HuffmanEncoder(CombinablePatternEncoder):
                 break
 
         encoder.huffman_dict = huffman_dict
+        encoder._decodetree = None
         return encoder
+
+
+    def save_binary(self, file_):
+        """Save the encoder in a compact binary format.
+
+        The format consists of the magic string BINARY_MAGIC, the version and
+        flags (uint16 each), the pattern type and the unknown element, followed
+        by one table per level (and one for the special elements) with the
+        null-separated elements and their code lengths (uint8). The codes of
+        all elements are stored as a single bit string at the end of the file,
+        unless the codes are canonical (flag BINARY_CANONICAL) - then they are
+        restored from the code lengths.
+        All numbers are little endian.
+
+        """
+
+        tables = self._get_tables()
+        for keys, _ in tables.values():
+            for key in keys:
+                form = getattr(key, 'form', key)
+                if not isinstance(form, str) or '\0' in form:
+                    raise EncodeError("Cannot store element in binary format: " + repr(form))
+
+        flags = BINARY_CANONICAL if self.is_canonical() else 0
+
+        file_.write(BINARY_MAGIC)
+        file_.write(struct.pack('<HH', BINARY_VERSION, flags))
+
+        _write_bytes(file_, (self.pattern_type.__module__ + ':' + self.pattern_type.__qualname__).encode())
+        file_.write(struct.pack('<B', self.unknown is not None))
+        _write_bytes(file_, (self.unknown or '').encode())
+
+        codes = bitarray.bitarray()
+        file_.write(struct.pack('<I', len(tables)))
+        for level, (keys, level_codes) in tables.items():
+
+            file_.write(struct.pack('<B', level is None))
+            _write_bytes(file_, (level or '').encode())
+            file_.write(struct.pack('<I', len(keys)))
+            _write_bytes(file_, '\0'.join(getattr(key, 'form', key) for key in keys).encode())
+            file_.write(bytes(len(code) for code in level_codes))
+
+            if not flags & BINARY_CANONICAL:
+                for code in level_codes:
+                    codes.extend(code)
+
+        file_.write(struct.pack('<Q', len(codes)))
+        file_.write(codes.tobytes())
+
+    @classmethod
+    def _load_binary(cls, file_):
+
+        ## map regular files into memory, other files (e.g. compressed) are read
+        if isinstance(file_, (io.BufferedReader, io.FileIO)):
+            data = mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ)
+            offset = file_.tell()
+        else:
+            data = file_.read()
+            offset = 0
+
+        try:
+            return cls._parse_binary(data, offset)
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+    @classmethod
+    def _parse_binary(cls, data, offset):
+
+        version, flags = struct.unpack_from('<HH', data, offset)
+        offset += 4
+        if version != BINARY_VERSION:
+            raise ValueError("Unsupported version of the encoder format: " + str(version))
+
+        pattern_type, offset = _read_bytes(data, offset)
+        module, qualname = pattern_type.decode().split(':')
+        pattern_type = importlib.import_module(module)
+        for name in qualname.split('.'):
+            pattern_type = getattr(pattern_type, name)
+
+        has_unknown, = struct.unpack_from('<B', data, offset)
+        unknown, offset = _read_bytes(data, offset + 1)
+        unknown = unknown.decode() if has_unknown else None
+
+        number_of_tables, = struct.unpack_from('<I', data, offset)
+        offset += 4
+
+        tables = []
+        for _ in range(number_of_tables):
+
+            is_special, = struct.unpack_from('<B', data, offset)
+            level, offset = _read_bytes(data, offset + 1)
+            size, = struct.unpack_from('<I', data, offset)
+            forms, offset = _read_bytes(data, offset + 4)
+            lengths = data[offset:offset + size]
+            offset += size
+
+            forms = forms.decode().split('\0') if size else []
+            if is_special:
+                tables.append((None, forms, lengths))
+            else:
+                tables.append((level.decode(), forms, lengths))
+
+        number_of_bits, = struct.unpack_from('<Q', data, offset)
+        offset += 8
+        codes = bitarray.bitarray()
+        codes.frombytes(bytes(data[offset:offset + (number_of_bits + 7) // 8]))
+
+        keys = []
+        code_lengths = []
+        for level, forms, lengths in tables:
+            keys.extend(form if level is None else PatternElement(form, level) for form in forms)
+            code_lengths.extend(lengths)
+
+        if flags & BINARY_CANONICAL:
+            huffman_dict = _canonical_codes(keys, code_lengths)
+        else:
+            huffman_dict = {}
+            position = 0
+            for key, length in zip(keys, code_lengths):
+                huffman_dict[key] = codes[position:position + length]
+                position += length
+
+        encoder = cls({}, pattern_type, unknown=unknown)
+        encoder.huffman_dict = huffman_dict
+        encoder.levels = set(level for level, _, _ in tables if level is not None)
+        return encoder
+
+
+class HuffmanCodeBuilder:
+    """Append codes of a HuffmanEncoder to a pattern.
+
+    The codes are collected in a single bitarray that is only converted
+    when the combined code is requested with to_bytes.
+
+    """
+
+    def __init__(self, encoded_pattern=b'', encoder_class=HuffmanEncoder):
+
+        self.encoder_class = encoder_class
+        self.code = encoder_class.to_bitarray(encoded_pattern)
+
+    def append(self, encoded_item):
+
+        self.code.extend(self.encoder_class.to_bitarray(encoded_item))
+        return self
+
+    def extend(self, encoded_items):
+
+        for encoded_item in encoded_items:
+            self.append(encoded_item)
+        return self
+
+    def to_bytes(self):
+
+        return self.encoder_class.from_bitarray(self.code)
@@ -0,0 +1,203 @@
+import operator
+import re
+
+import numpy
+
+
+class PatternFilter(object):
+    """A boolean expression over the statistics of a pattern.
+
+    Expressions consist of comparisons of a statistic with a number, e.g.
+    `frequency >= 2` or `uif-pmi > 0.5`, which can be combined with `and`,
+    `or`, `not` and parentheses. Missing statistics are treated as 0. The
+    operators are ==, !=, >=, <=, > and <.
+
+    """
+
+    operators = {
+        "==": operator.eq,
+        "!=": operator.ne,
+        ">=": operator.ge,
+        "<=": operator.le,
+        ">": operator.gt,
+        "<": operator.lt
+    }
+
+    _token_pattern = re.compile(r"""\s*(?:
+        (?P<number>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)|
+        (?P<operator>==|!=|>=|<=|>|<)|
+        (?P<paren>[()])|
+        (?P<name>[A-Za-z_][\w.-]*)
+    )""", re.VERBOSE)
+
+    def __init__(self, expression):
+
+        self.expression = expression
+        self._tokens = self._tokenize(expression)
+        self._position = 0
+        self.tree = self._parse_or()
+        if self._position < len(self._tokens):
+            self._error("unexpected '" + self._tokens[self._position][1] + "'")
+        del self._tokens
+
+    @classmethod
+    def from_threshold(cls, feature, op, threshold):
+        """Create a filter comparing a single statistic with threshold.
+
+        The feature name is used as it is, without parsing an expression.
+
+        """
+
+        if op not in cls.operators:
+            raise ValueError("Unknown operator: " + op)
+
+        pattern_filter = cls.__new__(cls)
+        pattern_filter.expression = feature + " " + op + " " + repr(threshold)
+        pattern_filter.tree = ('compare', feature, op, threshold)
+
+        return pattern_filter
+
+    def _error(self, message):
+
+        raise ValueError("Invalid filter expression '" + self.expression + "': " + message)
+
+    def _tokenize(self, expression):
+
+        tokens = []
+        position = 0
+        expression = expression.rstrip()
+
+        while position < len(expression):
+
+            match = self._token_pattern.match(expression, position)
+            if match is None or match.end() == position:
+                self._error("unexpected '" + expression[position:].strip() + "'")
+            position = match.end()
+
+            kind = match.lastgroup
+            value = match.group(kind)
+            if kind == 'name' and value in ('and', 'or', 'not'):
+                kind = value
+            tokens.append((kind, value))
+
+        return tokens
+
+    def _peek(self):
+
+        if self._position < len(self._tokens):
+            return self._tokens[self._position][0]
+        return None
+
+    def _next(self, kind):
+
+        if self._peek() != kind:
+            self._error("expected " + kind)
+        value = self._tokens[self._position][1]
+        self._position += 1
+        return value
+
+    def _parse_or(self):
+
+        operands = [self._parse_and()]
+        while self._peek() == 'or':
+            self._next('or')
+            operands.append(self._parse_and())
+
+        return operands[0] if len(operands) == 1 else ('or', operands)
+
+    def _parse_and(self):
+
+        operands = [self._parse_not()]
+        while self._peek() == 'and':
+            self._next('and')
+            operands.append(self._parse_not())
+
+        return operands[0] if len(operands) == 1 else ('and', operands)
+
+    def _parse_not(self):
+
+        if self._peek() == 'not':
+            self._next('not')
+            return ('not', self._parse_not())
+
+        if self._peek() == 'paren':
+            if self._next('paren') != '(':
+                self._error("unexpected ')'")
+            tree = self._parse_or()
+            if self._next('paren') != ')':
+                self._error("expected ')'")
+            return tree
+
+        name = self._next('name')
+        op = self._next('operator')
+        number = self._next('number')
+        try:
+            value = int(number)
+        except ValueError:
+            value = float(number)
+
+        return ('compare', name, op, value)
+
+    @property
+    def features(self):
+        """The names of the statistics used in the expression."""
+
+        def iter_features(tree):
+            if tree[0] == 'compare':
+                yield tree[1]
+            elif tree[0] == 'not':
+                yield from iter_features(tree[1])
+            else:
+                for operand in tree[1]:
+                    yield from iter_features(operand)
+
+        return list(dict.fromkeys(iter_features(self.tree)))
+
+    def _evaluate(self, tree, get_value, logical_and, logical_or, logical_not):
+
+        kind = tree[0]
+
+        if kind == 'compare':
+            _, name, op, value = tree
+            return self.operators[op](get_value(name), value)
+
+        if kind == 'not':
+            return logical_not(self._evaluate(tree[1], get_value, logical_and, logical_or, logical_not))
+
+        combine = logical_and if kind == 'and' else logical_or
+        result = None
+        for operand in tree[1]:
+            operand = self._evaluate(operand, get_value, logical_and, logical_or, logical_not)
+            result = operand if result is None else combine(result, operand)
+
+        return result
+
+    def __call__(self, stats):
+        """Evaluate the expression for a dictionary of statistics."""
+
+        return bool(self._evaluate(
+            self.tree, lambda name: stats.get(name, 0),
+            lambda a, b: a and b, lambda a, b: a or b, operator.not_))
+
+    def evaluate_columnar(self, pattern_set):
+        """Evaluate the expression for all patterns of a ColumnarPatternSet.
+
+        Returns a boolean array. A ValueError is raised if a statistic used
+        in the expression is not numeric.
+
+        """
+
+        def get_value(name):
+            if name in pattern_set.stats:
+                if pattern_set.stats[name][0].dtype.kind not in 'iuf':
+                    raise ValueError("Statistic '" + name + "' is not numeric")
+                return pattern_set.get_stat(name)
+            return numpy.zeros(len(pattern_set), dtype=numpy.int64)
+
+        return numpy.asarray(self._evaluate(
+            self.tree, get_value,
+            numpy.logical_and, numpy.logical_or, numpy.logical_not), dtype=bool)
+
+    def __repr__(self):
+
+        return self.__class__.__name__ + "(" + repr(self.expression) + ")"
@@ -1,6 +1,12 @@
 import gzip
+import heapq
+import itertools
 import json
 import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
 
 from factory_manager import FactoryManager
 
@@ -37,6 +43,111 @@ class MultiprocessMap(object):
 
 
 
+def iter_chunks(iterable, size):
+    """Split an iterable into lists of at most size items."""
+
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class UnsortedError(ValueError):
+    """Raised if the input of a merge join is not sorted."""
+
+
+def _iter_sorted(pairs):
+
+    previous = None
+    for number, pair in enumerate(pairs):
+
+        if number > 0 and not previous < pair[0]:
+            raise UnsortedError("Not sorted: " + repr(previous) + " before " + repr(pair[0]))
+        previous = pair[0]
+
+        yield pair
+
+
+def iter_join(items, values, key=None, co_sorted=True, default=None, required=False):
+    """Join items with the matching values from pairs of (key, value).
+
+    Yields every item together with its value or default if there is none
+    (a left join). key computes the key of an item (the item itself if not
+    given). If co_sorted is set, both are read in one pass (a merge join).
+    This needs both to be sorted by their keys without duplicates, as pattern
+    sets and the files derived from them are. Otherwise an UnsortedError is
+    raised, possibly after all items have been yielded. If co_sorted is not
+    set, the values are loaded into a dictionary (a hash join).
+
+    If required is set, a KeyError is raised for items without a value. In a
+    merge join, this raises an UnsortedError instead, as the value might be
+    missing only because the values are not sorted.
+
+    """
+
+    if key is None:
+        key = lambda item: item
+
+    if not co_sorted:
+
+        values = dict(values)
+        for item in items:
+            item_key = key(item)
+            if required and item_key not in values:
+                raise KeyError(item_key)
+            yield item, values.get(item_key, default)
+
+        return
+
+    values = _iter_sorted(values)
+    current = next(values, None)
+
+    for item_key, item in _iter_sorted((key(item), item) for item in items):
+
+        while current is not None and current[0] < item_key:
+            current = next(values, None)
+
+        if current is not None and current[0] == item_key:
+            yield item, current[1]
+        elif required:
+            raise UnsortedError("No value for " + repr(item_key) + " in a merge join")
+        else:
+            yield item, default
+
+    ## read the remaining values to make sure that no value was skipped
+    for _ in values:
+        pass
+
+
+def _tag_pairs(pairs, index):
+
+    for key, value in _iter_sorted(pairs):
+        yield key, index, value
+
+
+def iter_outer_join(*iterables):
+    """Merge several iterables of (key, value) pairs sorted by key.
+
+    Yields every key of any iterable together with a list of the values of
+    the key in each iterable (None if it is missing). An UnsortedError is
+    raised if an iterable is not sorted by key without duplicates.
+
+    """
+
+    merged = heapq.merge(*[_tag_pairs(pairs, index) for index, pairs in enumerate(iterables)],
+                         key=lambda item: item[:2])
+
+    for key, group in itertools.groupby(merged, key=lambda item: item[0]):
+
+        values = [None] * len(iterables)
+        for _, index, value in group:
+            values[index] = value
+
+        yield key, values
+
+
 def open_file(filename, mode='r', encoding='utf-8'):
 
     if filename.endswith(".gz"):
@@ -65,5 +176,264 @@ def open_json_config(config):
             return json.load(config_file)
 
 
+def _line_key(line):
+
+    ## lines are compared without the line break as done by `LC_ALL=C sort`
+    return line[:-1]
+
+def _write_run(args):
+
+    lines, filename = args
+
+    lines.sort(key=_line_key)
+    with open_file(filename, 'w') as run_file:
+        run_file.writelines(lines)
+
+    return filename
+
+def _read_runs(infile, buffer_size):
+
+    lines = []
+    size = 0
+
+    for line in infile:
+
+        if not line.endswith('\n'):
+            line += '\n'
+
+        lines.append(line)
+        size += sys.getsizeof(line)
+
+        if size >= buffer_size:
+            yield lines
+            lines = []
+            size = 0
+
+    if lines:
+        yield lines
+
+def merge_sorted_files(filenames, outfile, max_files=64, tmpdir=None, suffix=''):
+    """Merge files with sorted lines into outfile.
+
+    If there are more than max_files files, they are merged in several passes
+    using temporary files in tmpdir.
+
+    """
+
+    filenames = list(filenames)
+    temporary = []
+
+    try:
+        while len(filenames) > max_files:
+
+            merged = []
+            for start in range(0, len(filenames), max_files):
+                with tempfile.NamedTemporaryFile(dir=tmpdir, suffix=suffix, delete=False) as tmpfile:
+                    merged.append(tmpfile.name)
+                temporary.append(merged[-1])
+                merge_sorted_files(filenames[start:start + max_files], merged[-1])
+
+            filenames = merged
+
+        files = [open_file(filename) for filename in filenames]
+        try:
+            with open_file(outfile, 'w') as output:
+                output.writelines(heapq.merge(*files, key=_line_key))
+        finally:
+            for file_ in files:
+                file_.close()
+
+    finally:
+        for filename in temporary:
+            os.remove(filename)
+
+def sort_file(infile, outfile, buffer_size=100*1024**2, processes=0, tmpdir=None, compress=False):
+    """Sort the lines of infile into outfile using an external merge sort.
+
+    The lines are ordered by their code points, which gives the same result as
+    `LC_ALL=C sort` for utf-8 encoded files. At most buffer_size bytes of
+    lines are kept in memory per process, the sorted runs are written to
+    temporary files in tmpdir (compressed with gzip if compress is set).
+
+    """
+
+    suffix = '.gz' if compress else ''
+    rundir = tempfile.mkdtemp(dir=tmpdir)
+
+    try:
+        runs = []
+        with open_file(infile) as input_:
+            with MultiprocessMap(processes, chunksize=1) as m:
+
+                ## sort at most one run per process at once to bound memory
+                batch = []
+                for lines in _read_runs(input_, buffer_size):
+                    batch.append((lines, os.path.join(rundir, str(len(runs) + len(batch)) + suffix)))
+                    if len(batch) >= max(processes, 1):
+                        runs.extend(m(_write_run, batch))
+                        batch = []
+                runs.extend(m(_write_run, batch))
+
+        if len(runs) == 1 and not outfile.endswith('.gz') and not compress:
+            shutil.move(runs[0], outfile)
+        else:
+            merge_sorted_files(runs, outfile, tmpdir=rundir, suffix=suffix)
+
+    finally:
+        shutil.rmtree(rundir)
+
+
+class SortedGroups(object):
+    """Collect values by key and iterate over the keys in sorted order.
+
+    The groups are kept in memory until their estimated size exceeds
+    buffer_size bytes. Then they are written as a sorted run of tab separated
+    lines to a temporary file in tmpdir (compressed with gzip if compress is
+    set) and the runs are merged during iteration. Keys and values are sorted
+    in the same way as the lines `key\tvalue` by `LC_ALL=C sort`.
+
+    """
+
+    def __init__(self, buffer_size=100*1024**2, tmpdir=None, compress=False):
+
+        self.buffer_size = buffer_size
+        self.tmpdir = tmpdir
+        self.suffix = '.gz' if compress else ''
+
+        self.groups = {}
+        self.size = 0
+        self.runs = []
+        self.rundir = None
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+
+        self.close()
+
+    def close(self):
+
+        if self.rundir is not None:
+            shutil.rmtree(self.rundir)
+            self.rundir = None
+            self.runs = []
+
+    def add(self, key, value):
+
+        if key not in self.groups:
+            self.groups[key] = []
+            self.size += sys.getsizeof(key)
+        self.groups[key].append(value)
+        self.size += sys.getsizeof(value) + 8
+
+        if self.size >= self.buffer_size:
+            self._spill()
+
+    def _spill(self):
+
+        if self.rundir is None:
+            self.rundir = tempfile.mkdtemp(dir=self.tmpdir)
+
+        filename = os.path.join(self.rundir, str(len(self.runs)) + self.suffix)
+        with open_file(filename, 'w') as run_file:
+            for key, values in sorted(self.groups.items()):
+                for value in sorted(values):
+                    run_file.write(key + "\t" + value + "\n")
+
+        self.runs.append(filename)
+        self.groups = {}
+        self.size = 0
+
+    def __iter__(self):
+
+        if not self.runs:
+            for key, values in sorted(self.groups.items()):
+                yield key, sorted(values)
+            return
+
+        if self.groups:
+            self._spill()
+
+        files = [open_file(filename) for filename in self.runs]
+        try:
+            lines = (line[:-1].split("\t", 1) for line in heapq.merge(*files, key=_line_key))
+            for key, group in itertools.groupby(lines, key=lambda item: item[0]):
+                yield key, [value for _, value in group]
+        finally:
+            for file_ in files:
+                file_.close()
+
+
+class IdTable(object):
+    """Assign dense integer ids to strings (e.g. encoded patterns).
+
+    Ids are assigned in the order the strings are interned, starting with 0.
+    The table is saved as a text file with one string per line, the line
+    number (starting with 0) is the id of the string.
+
+    """
+
+    def __init__(self, values=()):
+
+        self.values = []
+        self.ids = None
+        for value in values:
+            self.intern(value)
+
+    def __len__(self):
+
+        return len(self.values)
+
+    def __getitem__(self, id_):
+
+        return self.values[id_]
+
+    def _get_ids(self):
+
+        ## the reverse index is only needed for interning
+        if self.ids is None:
+            self.ids = {value: id_ for id_, value in enumerate(self.values)}
+        return self.ids
+
+    def get_id(self, value):
+
+        return self._get_ids().get(value)
+
+    def intern(self, value):
+        """Return the id of value, a new id is assigned to unknown values."""
+
+        ids = self._get_ids()
+
+        try:
+            return ids[value]
+        except KeyError:
+            ids[value] = len(self.values)
+            self.values.append(value)
+            return ids[value]
+
+    def resolve(self, value):
+        """Return the string for an id, strings are returned unchanged."""
+
+        if isinstance(value, int):
+            return self.values[value]
+        return value
+
+    def save(self, filename):
+
+        with open_file(filename, 'w') as outfile:
+            for value in self.values:
+                outfile.write(value + "\n")
+
+    @classmethod
+    def load(cls, filename):
+
+        table = cls()
+        with open_file(filename) as infile:
+            table.values = [line.rstrip("\n") for line in infile]
+        return table
+
+
 factories = FactoryManager()
 factories.add_object_hierarchy("extractor", PatternExtractor)
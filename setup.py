@@ -15,6 +15,7 @@ setup(
         'bitarray',
         'conllu<4.0', # with 4.0 pickling TokenList does not work
         'factory-manager',
+        'numpy',
         'spacy'
     ],
     entry_points={
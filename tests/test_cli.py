@@ -8,7 +8,8 @@ from click.testing import CliRunner
 
 from cxnminer.pattern import PatternElement
 from cxnminer.pattern_encoder import PatternEncoder, Base64Encoder
-from cxnminer.cli import main
+from cxnminer.cli import main, decode_element, decode_element_code, get_stats_batch, get_top_n_lists, iter_joined_batches, map_contents, update_frequency_stats
+from cxnminer.utils.helpers import open_file
 
 basepatterns_with_tokens = {
     "dog [over, the, lazy]":
@@ -372,6 +373,138 @@ def test_extract_patterns_with_phrases(parameters, expected_patterns, expected_b
         assert basepatterns == expected_basepatterns
 
 
+def test_extract_patterns_multiprocessing():
+
+    infile_path = os.path.abspath('example_data/example_data_encoded.conllu')
+    dictfile_path = os.path.abspath('example_data/example_data_dict_filtered_encoded.json')
+    configfile_path = os.path.abspath('example_data/test_config.json')
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+
+        for processes in ['0', '2']:
+            result = runner.invoke(main, [
+                'extract-patterns',
+                infile_path,
+                'patterns_' + processes + '.tsv',
+                'base_' + processes + '.tsv',
+                dictfile_path,
+                configfile_path,
+                '--processes', processes,
+                '--chunksize', '1'
+            ])
+            assert result.exit_code == 0
+
+        assert filecmp.cmp('patterns_0.tsv', 'patterns_2.tsv', shallow=False)
+        assert filecmp.cmp('base_0.tsv', 'base_2.tsv', shallow=False)
+        assert os.path.getsize('base_2.tsv') > 0
+
+
+@pytest.mark.parametrize("options", [[], ['--buffer_size', '0']])
+def test_extract_patterns_aggregate(options):
+
+    infile_path = os.path.abspath('example_data/example_data_encoded.conllu')
+    dictfile_path = os.path.abspath('example_data/example_data_dict_filtered_encoded.json')
+    configfile_path = os.path.abspath('example_data/test_config.json')
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+
+        runner.invoke(main, [
+            'extract-patterns',
+            infile_path,
+            'patterns.tsv',
+            'base.tsv',
+            dictfile_path,
+            configfile_path
+        ])
+
+        for filename in ['patterns', 'base']:
+            runner.invoke(main, ['utils', 'sort-patterns', filename + '.tsv', filename + '_sorted.tsv'])
+            runner.invoke(main, ['utils', 'convert-pattern-list', filename + '_sorted.tsv', filename + '.jsonl'])
+
+        runner.invoke(main, [
+            'extract-patterns',
+            infile_path,
+            'patterns_aggregated.jsonl',
+            'base_aggregated.jsonl',
+            dictfile_path,
+            configfile_path,
+            '--aggregate'
+        ] + options)
+
+        assert filecmp.cmp('patterns.jsonl', 'patterns_aggregated.jsonl', shallow=False)
+        assert filecmp.cmp('base.jsonl', 'base_aggregated.jsonl', shallow=False)
+
+
+def test_update_frequency_stats():
+
+    base_frequencies = {"x": 1, "y": 2}
+    new_base_frequencies = {"x": 1, "z": 1}
+
+    ## base pattern x is no hapax anymore, z is new
+    assert update_frequency_stats({'frequency': 3, 'uif': 1}, ["x", "y"], ["x", "z"],
+                                  base_frequencies, new_base_frequencies) == {'frequency': 5, 'uif': 1}
+    ## the new pattern gets the frequency of x in both parts
+    assert update_frequency_stats(None, None, ["x", "x"],
+                                  base_frequencies, new_base_frequencies) == {'frequency': 2, 'uif': 0}
+    assert update_frequency_stats({'frequency': 2, 'uif': 0}, ["y"], None,
+                                  base_frequencies, new_base_frequencies) == {'frequency': 2, 'uif': 0}
+
+
+def test_incremental_update():
+
+    infile_path = os.path.abspath('example_data/example_data_encoded.conllu')
+    dictfile_path = os.path.abspath('example_data/example_data_dict_filtered_encoded.json')
+    configfile_path = os.path.abspath('example_data/test_config.json')
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+
+        sentences = open(infile_path).read().strip("\n").split("\n\n")
+        with open('old.conllu', 'w') as o:
+            o.write("\n\n".join(sentences[:2]) + "\n\n")
+        with open('new.conllu', 'w') as o:
+            o.write("\n\n".join(sentences[2:]) + "\n\n")
+
+        for command in [
+                ['extract-patterns', infile_path, 'patterns.jsonl', 'base.jsonl',
+                 dictfile_path, configfile_path, '--aggregate'],
+                ['extract-patterns', 'old.conllu', 'old_patterns.jsonl', 'old_base.jsonl',
+                 dictfile_path, configfile_path, '--aggregate'],
+                ['extract-patterns', 'new.conllu', 'new_patterns.jsonl', 'new_base.jsonl',
+                 dictfile_path, configfile_path, '--aggregate', '--sentence_offset', '2'],
+                ['utils', 'add-pattern-stats', 'patterns.jsonl', 'stats.json', '--base_patterns', 'base.jsonl'],
+                ['utils', 'add-pattern-stats', 'old_patterns.jsonl', 'old_stats.json',
+                 '--base_patterns', 'old_base.jsonl'],
+                ['utils', 'update-pattern-stats', 'old_patterns.jsonl', 'old_stats.json', 'old_base.jsonl',
+                 'new_patterns.jsonl', 'new_base.jsonl', 'updated_stats.json'],
+                ['utils', 'merge-pattern-sets', 'old_patterns.jsonl', 'new_patterns.jsonl', 'merged_patterns.jsonl'],
+                ['utils', 'merge-pattern-sets', 'old_base.jsonl', 'new_base.jsonl', 'merged_base.jsonl']
+        ]:
+            result = runner.invoke(main, command)
+            assert result.exit_code == 0
+
+        assert os.path.getsize('new_patterns.jsonl') > 0
+        assert filecmp.cmp('patterns.jsonl', 'merged_patterns.jsonl', shallow=False)
+        assert filecmp.cmp('base.jsonl', 'merged_base.jsonl', shallow=False)
+        assert filecmp.cmp('stats.json', 'updated_stats.json', shallow=False)
+
+        ## the merge needs sorted pattern sets
+        lines = open('new_patterns.jsonl').readlines()
+        with open('shuffled_patterns.jsonl', 'w') as o:
+            o.writelines(lines[1::2] + lines[::2])
+
+        for command in [
+                ['utils', 'update-pattern-stats', 'old_patterns.jsonl', 'old_stats.json', 'old_base.jsonl',
+                 'shuffled_patterns.jsonl', 'new_base.jsonl', 'updated_stats.json'],
+                ['utils', 'merge-pattern-sets', 'old_patterns.jsonl', 'shuffled_patterns.jsonl', 'merged_patterns.jsonl']
+        ]:
+            result = runner.invoke(main, command)
+            assert result.exit_code == 2
+            assert "sorted" in result.output
+
+
 @pytest.mark.parametrize("tofile", [True, False])
 def test_extract_patterns_with_logging(tofile):
 
@@ -421,6 +554,20 @@ def test_extract_patterns_with_logging(tofile):
         assert os.path.isfile(log_filename)
 
 
+def test_decode_element():
+
+    encoder = Base64Encoder(PatternEncoder.load(open(os.path.abspath('example_data/example_data_encoder'), 'rb')), binary=False)
+    encoded = encoder.encode_item(PatternElement('the', 'lemma'))
+    unknowns = {None: encoded}
+
+    decode_element_code.cache_clear()
+    code = decode_element(encoded, None, unknowns)
+
+    assert decode_element(encoded, None, unknowns) is code
+    assert decode_element("not encoded", None, unknowns) == code
+    assert decode_element_code.cache_info().hits >= 2
+
+
 def test_extract_vocabulary():
 
     infile_path = os.path.abspath('example_data/example_data.conllu')
@@ -473,6 +620,300 @@ def test_create_encoder():
 
     assert all(results)
 
+@pytest.mark.parametrize("outfile", ["example_data_encoder", "example_data_encoder.gz"])
+def test_convert_encoder(outfile):
+
+    encoder_path = os.path.abspath('example_data/example_data_encoder')
+    patterns_path = os.path.abspath('example_data/example_data_pattern_set.jsonl')
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+
+        runner.invoke(main, [
+            'utils',
+            'convert-encoder',
+            encoder_path,
+            outfile
+        ])
+
+        encoder = Base64Encoder(PatternEncoder.load(open(encoder_path, 'rb')))
+        with open_file(outfile, 'rb') as encoder_file:
+            converted_encoder = Base64Encoder(PatternEncoder.load(encoder_file))
+
+        assert converted_encoder.encoder.huffman_dict == encoder.encoder.huffman_dict
+        for line in open(patterns_path):
+            pattern, _ = json.loads(line)
+            assert converted_encoder.decode(pattern) == encoder.decode(pattern)
+
+
+def test_intern_patterns():
+
+    patterns_path = os.path.abspath('example_data/example_data_pattern_set.jsonl')
+    base_patterns_path = os.path.abspath('example_data/example_data_base_pattern_set.jsonl')
+    encoder_path = os.path.abspath('example_data/example_data_encoder')
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+
+        for args in [
+                [base_patterns_path, 'base_patterns.jsonl', 'base_patterns.ids'],
+                [patterns_path, 'patterns.jsonl', 'patterns.ids', '--contents_table', 'base_patterns.ids'],
+                ['patterns.jsonl', 'patterns_resolved.jsonl', 'patterns.ids',
+                 '--contents_table', 'base_patterns.ids']
+        ]:
+            command = 'intern-patterns' if args[1] != 'patterns_resolved.jsonl' else 'resolve-patterns'
+            result = runner.invoke(main, ['utils', command] + args)
+            assert result.exit_code == 0
+
+        for line in open('patterns.jsonl'):
+            pattern, contents = json.loads(line)
+            assert isinstance(pattern, int)
+            assert all(isinstance(content, int) for content in contents)
+
+        assert filecmp.cmp(patterns_path, 'patterns_resolved.jsonl', shallow=False)
+
+        ## decoding works on the ids
+        result = runner.invoke(main, [
+            'utils', 'decode-patterns', 'patterns.jsonl', encoder_path, 'decoded',
+            '--table', 'patterns.ids'
+        ])
+        assert result.exit_code == 0
+
+
+def test_map_contents():
+
+    assert map_contents(["a", "b"], str.upper) == ["A", "B"]
+    assert map_contents({'stats': {}, 'base_patterns': [["a", [1]], "b"]}, str.upper) == {
+        'stats': {}, 'base_patterns': [["A", [1]], "B"]}
+
+    ## statistics are left as they are
+    stats = {'frequency': 2, 'uif': 1}
+    assert map_contents(stats, str.upper) == {'frequency': 2, 'uif': 1}
+
+
+def test_filter_columnar_patterns():
+
+    patterns_path = os.path.abspath('example_data/example_data_pattern_set.jsonl')
+    base_patterns_path = os.path.abspath('example_data/example_data_base_pattern_set.jsonl')
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+
+        for command, args in [
+                ('intern-patterns', [base_patterns_path, 'base_patterns.jsonl', 'base_patterns.ids']),
+                ('intern-patterns', [patterns_path, 'patterns.jsonl', 'patterns.ids',
+                                     '--contents_table', 'base_patterns.ids']),
+                ('add-pattern-stats', ['patterns.jsonl', 'stats.json', '--base_patterns', 'base_patterns.jsonl']),
+                ('filter-patterns', ['patterns.jsonl', 'stats.json', 'frequency', '2', 'frequent.jsonl']),
+                ('convert-pattern-set', ['patterns.jsonl', 'patterns.npz']),
+                ('convert-pattern-set', ['stats.json', 'stats.npz']),
+                ('filter-patterns', ['patterns.npz', 'stats.npz', 'frequency', '2', 'frequent.npz']),
+                ('convert-pattern-set', ['frequent.npz', 'frequent_converted.jsonl'])
+        ]:
+            result = runner.invoke(main, ['utils', command] + args)
+            assert result.exit_code == 0
+
+        assert filecmp.cmp('frequent.jsonl', 'frequent_converted.jsonl', shallow=False)
+
+        with open('profile_stats.json', 'w') as o:
+            o.write('[0, {"frequency": 2, "pattern_profile": "a b"}]\n')
+        assert runner.invoke(main, ['utils', 'convert-pattern-set', 'profile_stats.json', 'profile_stats.npz']).exit_code == 0
+        result = runner.invoke(main, ['utils', 'filter-patterns', 'patterns.npz', 'profile_stats.npz',
+                                      'pattern_profile', '1', 'profile.npz'])
+        assert result.exit_code == 2
+        assert "not numeric" in result.output
+
+
+@pytest.mark.parametrize("shuffle", [False, True])
+def test_select_patterns(shuffle):
+
+    patterns_path = os.path.abspath('example_data/example_data_pattern_set.jsonl')
+    stats_path = os.path.abspath('example_data/example_data_patterns_simple_stats.json')
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+
+        if shuffle:
+            lines = open(stats_path).readlines()
+            with open('stats.json', 'w') as o:
+                o.writelines(lines[1::2] + lines[::2])
+            stats_path = 'stats.json'
+
+        for command, args in [
+                ('filter-patterns', [patterns_path, stats_path, 'frequency', '2', 'frequent.jsonl']),
+                ('filter-patterns', ['frequent.jsonl', stats_path, 'uif', '3', 'frequent_uif.jsonl',
+                                     '--operator', '<']),
+                ('filter-patterns', ['frequent_uif.jsonl', stats_path, 'frequency', '2.5', 'chained.jsonl']),
+                ('select-patterns', [patterns_path, stats_path, 'frequency >= 2.5 and not uif >= 3', 'selected.jsonl'])
+        ]:
+            result = runner.invoke(main, ['utils', command] + args)
+            assert result.exit_code == 0
+
+        assert len(open('selected.jsonl').readlines()) > 0
+        assert filecmp.cmp('chained.jsonl', 'selected.jsonl', shallow=False)
+
+        result = runner.invoke(main, ['utils', 'select-patterns', patterns_path, stats_path,
+                                      'frequency >=', 'invalid.jsonl'])
+        assert result.exit_code != 0
+
+
+def test_get_stats_batch():
+
+    lines = [
+        '["a", ["x", "y", "x"]]\n',
+        '["b", []]\n',
+        '["c", ["y", "z"]]\n'
+    ]
+    base_patterns = {"x": 1, "y": 3, "z": 1}
+
+    stats = get_stats_batch(lines, None, None, base_patterns, None, None, None)
+
+    assert stats == [
+        ("a", {'frequency': 4, 'uif': 1}),
+        ("b", {'frequency': 0, 'uif': 0}),
+        ("c", {'frequency': 4, 'uif': 1})
+    ]
+    ## the statistics do not depend on the batch
+    assert stats == [get_stats_batch([line], None, None, base_patterns, None, None, None)[0] for line in lines]
+
+
+@pytest.mark.parametrize("stats_options", [
+    [],
+    ['--processes', '2']
+])
+@pytest.mark.parametrize("features", [None, 'features.jsonl', 'features.npz'])
+@pytest.mark.parametrize("shuffle", [False, True])
+def test_add_pattern_stats_options(stats_options, features, shuffle):
+
+    patterns_path = os.path.abspath('example_data/example_data_pattern_set_frequent.jsonl')
+    expected_path = os.path.abspath('example_data/example_data_patterns_stats.json')
+    encoder_path = os.path.abspath('example_data/example_data_encoder')
+    options = [
+        '--decoded_patterns', os.path.abspath('example_data/example_data_pattern_set_frequent_decoded'),
+        '--config', os.path.abspath('example_data/example_config.json'),
+        '--vocabulary_probs', os.path.abspath('example_data/example_data_dictionary_probs.json'),
+        '--known_stats', os.path.abspath('example_data/example_data_patterns_simple_stats.json'),
+        '--pattern_profile_frequency', os.path.abspath('example_data/example_data_pattern_set_frequent_type_frequencies.json')
+    ]
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+
+        if features is not None:
+            result = runner.invoke(main, [
+                'utils', 'decode-patterns', patterns_path, encoder_path, features, '--features'
+            ])
+            assert result.exit_code == 0
+            options[1] = features
+
+        if shuffle:
+            lines = open(options[7]).readlines()
+            with open('known_stats.json', 'w') as o:
+                o.writelines(lines[1::2] + lines[::2])
+            options[7] = 'known_stats.json'
+
+        result = runner.invoke(main, [
+            'utils', 'add-pattern-stats', patterns_path, 'stats.json', '--batch_size', '10'
+        ] + options + stats_options)
+
+        assert result.exit_code == 0
+        assert filecmp.cmp('stats.json', expected_path, shallow=False)
+
+
+def test_iter_joined_batches():
+
+    lines = ['["a", []]\n', '["b", []]\n', '["c", []]\n']
+
+    batches = list(iter_joined_batches(lines, [[("a", 1), ("c", 3)], None, [("b", 2), ("c", 4), ("d", 5)]], 2))
+    assert batches == [(lines[:2], [{"a": 1}, None, {"b": 2}]), (lines[2:], [{"c": 3}, None, {"c": 4}])]
+
+    with pytest.raises(ValueError):
+        list(iter_joined_batches(lines, [[("c", 3), ("a", 1)]], 2))
+
+    batches = list(iter_joined_batches(lines, [[("c", 3), ("a", 1)]], 2, co_sorted=False))
+    assert batches == [(lines[:2], [{"a": 1}]), (lines[2:], [{"c": 3}])]
+
+
+def test_get_top_n_lists():
+
+    patterns = [
+        ("a", {"x": 1, "y": 2}, ["a1"]),
+        ("b", {"x": 3, "y": 1}, ["b1"]),
+        ("c", {"x": 1, "y": 3}, ["c1"]),
+        ("d", {"x": 3, "y": 1}, ["d1"])
+    ]
+
+    assert get_top_n_lists(iter(patterns), [(["x"], 3), (["x", "y"], 3), (["y"], 0), (["y"], 10)]) == [
+        [patterns[1], patterns[3], patterns[0]],
+        [patterns[1], patterns[3], patterns[2]],
+        [],
+        sorted(patterns, key=lambda pattern: pattern[1]["y"], reverse=True)
+    ]
+
+
+@pytest.mark.parametrize("shuffle", [False, True])
+def test_get_top_n_multiple_lists(shuffle):
+
+    patterns_path = os.path.abspath('example_data/example_data_pattern_set_frequent.jsonl')
+    stats_path = os.path.abspath('example_data/example_data_patterns_stats.json')
+    expected_path = os.path.abspath('example_data/example_data_pattern_set_top_2_uifpmi.jsonl')
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+
+        if shuffle:
+            lines = open(stats_path).readlines()
+            with open('stats.json', 'w') as o:
+                o.writelines(lines[1::2] + lines[::2])
+            stats_path = 'stats.json'
+
+        result = runner.invoke(main, [
+            'utils', 'get-top-n', patterns_path, stats_path, 'uif-pmi', '2', 'top_uifpmi.jsonl',
+            '--top_n', 'frequency,uif', '5', 'top_frequency.jsonl'
+        ])
+        assert result.exit_code == 0
+
+        assert filecmp.cmp('top_uifpmi.jsonl', expected_path, shallow=False)
+
+        top_frequency = [json.loads(line)[1]['stats'] for line in open('top_frequency.jsonl')]
+        assert len(top_frequency) == 5
+        assert top_frequency == sorted(top_frequency, key=lambda stats: (stats['frequency'], stats['uif']), reverse=True)
+
+
+def test_get_top_n_base_patterns():
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+
+        with open('base_patterns.jsonl', 'w') as o:
+            for base_pattern, sentences in [
+                    ("a", [[1, [0]], [2, [1]]]),
+                    ("b", [[3, [2]]]),
+                    ("c", [[4, [0]], [5, [1]], [6, [2]]])
+            ]:
+                o.write(json.dumps([base_pattern, [json.dumps(sentence) for sentence in sentences]]) + "\n")
+
+        with open('patterns.jsonl', 'w') as o:
+            o.write(json.dumps(["p1", {"stats": {}, "base_patterns": ["c", "b", "a"]}]) + "\n")
+            o.write(json.dumps(["p2", {"stats": {}, "base_patterns": ["b"]}]) + "\n")
+
+        result = runner.invoke(main, [
+            'utils', 'get-top-n-base-patterns', 'patterns.jsonl', 'base_patterns.jsonl', '2', 'top.jsonl',
+            '--example_ids', 'example_ids.json'
+        ])
+        assert result.exit_code == 0
+
+        result = [json.loads(line) for line in open('top.jsonl')]
+        assert result == [
+            ["p1", {"stats": {}, "base_patterns": [
+                ["a", [[0, [0]], [1, [1]]], 2],
+                ["c", [[3, [0]], [4, [1]], [5, [2]]], 3]
+            ]}],
+            ["p2", {"stats": {}, "base_patterns": [["b", [[2, [2]]], 1]]}]
+        ]
+        assert sorted(json.load(open('example_ids.json'))) == [0, 1, 2, 3, 4, 5]
+
+
 def test_encode_vocabulary():
 
     infile_path = os.path.abspath('example_data/example_data_dict_filtered.json')
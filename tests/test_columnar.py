@@ -0,0 +1,86 @@
+import io
+
+import numpy
+import pytest
+
+from cxnminer.columnar import ColumnarPatternSet, ColumnarPatternFeatures
+from cxnminer.pattern import PatternFeatures
+
+
+pattern_set_lines = [
+    '[0, [3, 1]]\n',
+    '[1, []]\n',
+    '[4, [0, 2, 2]]\n'
+]
+
+stats_lines = [
+    '[0, {"frequency": 2, "pmi": 0.5, "pattern_profile": "a"}]\n',
+    '[1, {"frequency": 1}]\n',
+    '[4, {"frequency": 3, "pmi": -1.25, "pattern_profile": "b"}]\n'
+]
+
+
+@pytest.mark.parametrize("lines", [pattern_set_lines, stats_lines])
+def test_jsonl_roundtrip(tmp_path, lines):
+
+    pattern_set = ColumnarPatternSet.from_jsonl(lines)
+
+    filename = str(tmp_path / 'pattern_set.npz')
+    pattern_set.save(filename)
+    loaded_pattern_set = ColumnarPatternSet.load(filename)
+
+    output = io.StringIO()
+    loaded_pattern_set.write_jsonl(output)
+
+    assert output.getvalue() == "".join(lines)
+
+
+def test_columns():
+
+    pattern_set = ColumnarPatternSet.from_jsonl(pattern_set_lines)
+
+    assert len(pattern_set) == 3
+    assert pattern_set.patterns.tolist() == [0, 1, 4]
+    assert pattern_set.get_contents(2).tolist() == [0, 2, 2]
+
+    stats = ColumnarPatternSet.from_jsonl(stats_lines)
+
+    assert stats.get_stat('frequency').dtype == numpy.int64
+    assert stats.get_stat('pmi').tolist() == [0.5, 0, -1.25]
+
+
+def test_select():
+
+    pattern_set = ColumnarPatternSet.from_jsonl(pattern_set_lines)
+    selected = pattern_set.select([True, False, True])
+
+    assert list(selected) == [(0, [3, 1]), (4, [0, 2, 2])]
+
+
+def test_needs_ids():
+
+    with pytest.raises(ValueError):
+        ColumnarPatternSet.from_jsonl(['["pattern", [1]]\n'])
+
+
+@pytest.mark.parametrize("patterns", [[0, 1, 4], ["a", "b", "c"]])
+def test_features_roundtrip(tmp_path, patterns):
+
+    features = list(zip(patterns, [
+        PatternFeatures(2, "p1", [("lemma", "dog"), ("upos", "NOUN")]),
+        PatternFeatures(1, "p2", [("lemma", "dog")]),
+        PatternFeatures(3, "p1", [("upos", "DET"), ("upos", "NOUN"), ("lemma", "cat")])
+    ]))
+
+    columnar_features = ColumnarPatternFeatures.from_features(features)
+    assert columnar_features.profile_table.tolist() == ["p1", "p2"]
+    assert columnar_features.profiles.tolist() == [0, 1, 0]
+    assert columnar_features.level_table.tolist() == ["lemma", "upos"]
+    assert columnar_features.offsets.tolist() == [0, 2, 3, 6]
+
+    filename = str(tmp_path / 'features.npz')
+    columnar_features.save(filename)
+    loaded_features = ColumnarPatternFeatures.load(filename)
+
+    assert len(loaded_features) == 3
+    assert list(loaded_features) == features
@@ -1,5 +1,9 @@
 import io
+import pickle
 
+import bitarray
+import bitarray.util
+import numpy
 import pytest
 
 from cxnminer.pattern_encoder import PatternEncoder, Base64Encoder, BitEncoder, HuffmanEncoder, EncodeError
@@ -235,6 +239,28 @@ def test_append(encoder):
     assert encoder.decode(pattern) == expected_pattern
 
 
+@pytest.mark.parametrize("encoder", encoder)
+def test_encode_decode_batch(encoder):
+
+    patterns = [
+        SNGram.from_element_list([
+            PatternElement('fox', 'form'),
+            SNGram.LEFT_BRACKET,
+            PatternElement('The', 'form'),
+            SNGram.COMMA,
+            PatternElement('quick', 'form'),
+            SNGram.RIGHT_BRACKET
+        ]),
+        SNGram.from_element_list([PatternElement('brown', 'form')]),
+        SNGram.from_element_list([PatternElement('fox', 'form'), PatternElement('brown', 'form')])
+    ]
+
+    encoded_patterns = encoder.encode_batch(iter(patterns))
+
+    assert encoded_patterns == [encoder.encode(pattern) for pattern in patterns]
+    assert encoder.decode_batch(iter(encoded_patterns)) == patterns
+
+
 comparison_function = {
     BitEncoder: lambda orig, loaded: orig.dictionaries == loaded.dictionaries,
     HuffmanEncoder: lambda orig, loaded: orig.huffman_dict == loaded.huffman_dict,
@@ -254,3 +280,187 @@ def test_save(encoder):
     output.close()
 
     assert comparison_function[encoder.__class__](encoder, encoder_loaded)
+
+
+@pytest.mark.parametrize("bits", ['', '0', '1', '0000000', '00000000', '10110', '0'*17, '1'*40 + '01'])
+def test_huffman_bitarray_conversion(bits):
+
+    code = bitarray.bitarray(bits)
+    encoded = HuffmanEncoder.from_bitarray(code)
+
+    assert encoded == PatternEncoder._int_2_bytes(bitarray.util.ba2int(HuffmanEncoder.prefix + code))
+    assert HuffmanEncoder.to_bitarray(encoded) == code
+
+
+def test_huffman_combine_many():
+
+    encoder = HuffmanEncoder({'form': {'fox': 5, 'The': 10, 'quick': 3, 'brown': 8}}, SNGram)
+    pattern_list = [
+        PatternElement('fox', 'form'),
+        SNGram.LEFT_BRACKET,
+        PatternElement('The', 'form'),
+        SNGram.COMMA,
+        PatternElement('quick', 'form'),
+        SNGram.RIGHT_BRACKET
+    ]
+    codes = [encoder.encode_item(element) for element in pattern_list]
+
+    pattern = b''
+    for code in codes:
+        pattern = HuffmanEncoder.combine(pattern, code)
+
+    assert HuffmanEncoder.combine_many(codes) == pattern
+    assert HuffmanEncoder.builder(codes[0]).extend(codes[1:]).to_bytes() == pattern
+    assert encoder.decode(pattern) == SNGram.from_element_list(pattern_list)
+
+
+def test_huffman_decode_cache():
+
+    encoder = Base64Encoder(HuffmanEncoder({'form': {'fox': 5, 'The': 10, 'quick': 3, 'brown': 8}}, SNGram))
+    encoder.set_cache_size(1)
+
+    fox = encoder.encode_item(PatternElement('fox', 'form'))
+    brown = encoder.encode_item(PatternElement('brown', 'form'))
+
+    decoded_fox = encoder.decode(fox)
+    assert encoder.decode(fox) is decoded_fox
+
+    encoder.decode(brown)
+    assert encoder.decode(fox) is not decoded_fox
+    assert encoder.decode(fox) == decoded_fox
+
+    ## the decoding tree and cached patterns are not pickled
+    encoder_copy = pickle.loads(pickle.dumps(encoder))
+    assert encoder_copy.decode(fox) == decoded_fox
+
+
+def test_bitencoder_id_matrix():
+
+    encoder = BitEncoder({'form': set(['fox', 'The', 'quick', 'brown']), 'pos': set(['NOUN'])}, SNGram)
+
+    patterns = [
+        SNGram.from_element_list([
+            PatternElement('fox', 'form'),
+            SNGram.LEFT_BRACKET,
+            {'form': 'The', 'pos': 'NOUN'},
+            SNGram.COMMA,
+            PatternElement('quick', 'form'),
+            SNGram.RIGHT_BRACKET
+        ]),
+        SNGram.from_element_list([
+            PatternElement('NOUN', 'pos'),
+            SNGram.LEFT_BRACKET,
+            PatternElement('brown', 'form'),
+            SNGram.RIGHT_BRACKET
+        ])
+    ]
+    encoded_patterns = [encoder.encode(pattern) for pattern in patterns]
+
+    id_matrix = encoder.to_id_matrix(encoded_patterns)
+
+    assert id_matrix.dtype == numpy.uint16
+    assert id_matrix.shape == (2, 9)
+    assert id_matrix[0].tolist() == encoder.encode_ids(patterns[0]).tolist()
+    assert id_matrix[1].tolist() == encoder.encode_ids(patterns[1]).tolist() + [0]*7
+
+    assert encoder.from_id_matrix(id_matrix) == encoded_patterns
+    assert [encoder.decode_ids(ids) for ids in id_matrix.tolist()] == patterns
+    assert [encoder.decode(encoded_pattern) for encoded_pattern in encoded_patterns] == patterns
+    assert encoder.decode_batch(encoded_patterns) == patterns
+
+
+def test_bitencoder_decode_unknown_id():
+
+    encoder = BitEncoder({'form': set(['fox'])}, SNGram)
+
+    with pytest.raises(ValueError):
+        encoder.decode_ids([31])
+
+
+def test_bitencoder_decode_cache():
+
+    encoder = Base64Encoder(BitEncoder({'form': set(['fox', 'brown'])}, SNGram))
+    encoder.set_cache_size(1)
+
+    fox = encoder.encode_item(PatternElement('fox', 'form'))
+    brown = encoder.encode_item(PatternElement('brown', 'form'))
+
+    decoded_fox = encoder.decode(fox)
+    assert encoder.decode(fox) is decoded_fox
+
+    encoder.decode(brown)
+    assert encoder.decode(fox) is not decoded_fox
+    assert encoder.decode(fox) == decoded_fox
+
+    encoder_copy = pickle.loads(pickle.dumps(encoder))
+    assert len(encoder_copy.encoder._decode_cache) == 0
+    assert not hasattr(encoder_copy.encoder, '_id_elements')
+    assert encoder_copy.decode(fox) == decoded_fox
+
+
+@pytest.mark.parametrize("unknown", [None, "__unknown__"])
+def test_save_binary(unknown):
+
+    encoder = HuffmanEncoder({'form': {'fox': 5, 'The': 10, 'quick': 3, 'brown': 8}, 'pos': {'NOUN': 2}},
+                             SNGram, unknown=unknown)
+
+    output = io.BytesIO()
+    encoder.save_binary(output)
+    output.seek(0)
+    encoder_loaded = PatternEncoder.load(output)
+
+    assert encoder_loaded.huffman_dict == encoder.huffman_dict
+    assert encoder_loaded.unknown == encoder.unknown
+    assert encoder_loaded.get_levels() == encoder.get_levels()
+    assert encoder_loaded.get_pattern_type() == SNGram
+
+
+def test_huffman_canonical():
+
+    frequencies = {'form': {'fox': 5, 'The': 10, 'quick': 3, 'brown': 8}, 'pos': {'NOUN': 2}}
+    encoder = HuffmanEncoder(frequencies, SNGram, unknown="__unknown__")
+    canonical_encoder = HuffmanEncoder(frequencies, SNGram, unknown="__unknown__", canonical=True)
+
+    assert canonical_encoder.is_canonical()
+    assert canonical_encoder.huffman_dict.keys() == encoder.huffman_dict.keys()
+    for key, code in canonical_encoder.huffman_dict.items():
+        assert len(code) == len(encoder.huffman_dict[key])
+
+    pattern =  SNGram.from_element_list([
+        PatternElement('NOUN', 'pos'),
+        SNGram.LEFT_BRACKET,
+        PatternElement('The', 'form'),
+        SNGram.COMMA,
+        PatternElement('quick', 'form'),
+        SNGram.RIGHT_BRACKET
+    ])
+    assert canonical_encoder.decode(canonical_encoder.encode(pattern)) == pattern
+
+    ## canonical codes can be combined like other codes
+    encoded = canonical_encoder.encode_item(PatternElement('NOUN', 'pos'))
+    for element in [SNGram.LEFT_BRACKET, PatternElement('The', 'form'), SNGram.COMMA,
+                    PatternElement('quick', 'form'), SNGram.RIGHT_BRACKET]:
+        encoded = HuffmanEncoder.combine(encoded, canonical_encoder.encode_item(element))
+
+    assert canonical_encoder.decode(encoded) == pattern
+
+
+def test_save_binary_canonical():
+
+    frequencies = {'form': {'fox': 5, 'The': 10, 'quick': 3, 'brown': 8}, 'pos': {'NOUN': 2}}
+    encoder = HuffmanEncoder(frequencies, SNGram, unknown="__unknown__")
+    canonical_encoder = HuffmanEncoder(frequencies, SNGram, unknown="__unknown__", canonical=True)
+
+    output = io.BytesIO()
+    encoder.save_binary(output)
+    canonical_output = io.BytesIO()
+    canonical_encoder.save_binary(canonical_output)
+
+    ## only the code lengths are stored
+    assert len(canonical_output.getvalue()) < len(output.getvalue())
+
+    canonical_output.seek(0)
+    encoder_loaded = PatternEncoder.load(canonical_output)
+
+    assert encoder_loaded.huffman_dict == canonical_encoder.huffman_dict
+    assert encoder_loaded.is_canonical()
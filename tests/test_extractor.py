@@ -521,3 +521,19 @@ def test_sentence_that_is_not_parseable():
     assert extractor.extract_patterns(conllu.parse(data)[0]) == []
 
 
+
+
+def test_bushy_sentence_is_not_cut_off():
+
+    ## the root has 2^7 combinations of open paths, but all of them are too large
+    lines = ["1\tn0\tn\tNOUN\tNN\t_\t0\troot\t_\t_"]
+    for i in range(1, 8):
+        lines.append("\t".join([str(2*i), "n" + str(i), "n", "NOUN", "NN", "_", "1", "obj", "_", "_"]))
+        lines.append("\t".join([str(2*i + 1), "d" + str(i), "d", "DET", "DT", "_", str(2*i), "det", "_", "_"]))
+    sentence = conllu.parse("\n".join(lines) + "\n\n")[0]
+
+    extractor = SyntacticNGramExtractor(
+        min_size=2, max_size=4, special_node_conversion=conversion_function)
+
+    assert set([str(pattern.get_pattern_list(['form', 'function'])[0]) for pattern in extractor.extract_patterns(sentence)]) == set(
+        ["n" + str(i) + " d" + str(i) for i in range(1, 8)])
@@ -1,9 +1,11 @@
+import pickle
+
 import pytest
 from pytest_cases import parametrize_with_cases, THIS_MODULE
 
 import conllu
 
-from cxnminer.pattern import PatternElement, TokenSNGram, SNGram
+from cxnminer.pattern import PatternElement, PatternFeatures, TokenSNGram, SNGram
 
 def case_fox():
 
@@ -349,3 +351,68 @@ def test_sngram_get_pattern_profile(sngram, expected):
 
         assert pattern.get_pattern_profile(False) in expected.get("profiles", set())
 
+
+
+@parametrize_with_cases("sngram,expected", cases=THIS_MODULE)
+def test_sngram_get_key(sngram, expected):
+
+    patterns = sngram.get_pattern_list(['form', 'upostag'])
+    copies = [SNGram.from_element_list(pattern.get_element_list(),
+                                       left_bracket=sngram.LEFT_BRACKET,
+                                       right_bracket=sngram.RIGHT_BRACKET,
+                                       comma=sngram.COMMA) for pattern in patterns]
+
+    assert [pattern.get_key() for pattern in patterns] == [pattern.get_key() for pattern in copies]
+    assert len(set(pattern.get_key() for pattern in patterns)) == len(set(str(pattern) for pattern in patterns))
+    assert sngram.get_key() == TokenSNGram(sngram.tree).get_key()
+
+    ## the cached key is not pickled
+    pattern = patterns[0]
+    pattern.get_key()
+    assert '_key' not in pickle.loads(pickle.dumps(pattern)).__dict__
+    assert pickle.loads(pickle.dumps(pattern)).get_key() == pattern.get_key()
+
+
+@parametrize_with_cases("sngram,expected", cases=THIS_MODULE)
+def test_tsngram_iter_pattern_list(sngram, expected):
+
+    features = ['form', 'upostag']
+
+    def predicate(element):
+        return element.level != 'upostag' or element.form != 'ADJ'
+
+    expected_patterns = [
+        pattern for pattern in sngram.get_pattern_list(features)
+        if all(predicate(element) for element in pattern.get_element_list() if isinstance(element, PatternElement))
+    ]
+
+    assert list(sngram.iter_pattern_list(features, predicate)) == expected_patterns
+
+
+@parametrize_with_cases("sngram,expected", cases=THIS_MODULE)
+def test_tsngram_iter_trees(sngram, expected):
+
+    features = ['form', 'upostag']
+
+    def make_tree(element, children):
+        return [element] + [child_element for child in (children or ()) for child_element in child]
+
+    assert list(sngram.iter_trees(features, make_tree=make_tree)) == [
+        [element for element in pattern.get_element_list() if isinstance(element, PatternElement)]
+        for pattern in sngram.get_pattern_list(features)
+    ]
+
+
+@parametrize_with_cases("sngram,expected", cases=THIS_MODULE)
+def test_pattern_features(sngram, expected):
+
+    pattern = sngram.get_pattern_list(['form'])[0]
+    features = PatternFeatures.from_pattern(pattern)
+
+    assert features.length == expected['length']
+    assert features.get_pattern_profile() == pattern.get_pattern_profile()
+    assert features.elements == [
+        (element.level, element.form)
+        for element in expected['repr'] if isinstance(element, PatternElement)
+    ]
+    assert PatternFeatures.from_list(features.to_list()) == features
@@ -0,0 +1,89 @@
+import pytest
+
+from cxnminer.columnar import ColumnarPatternSet
+from cxnminer.pattern_filter import PatternFilter
+
+
+stats = [
+    {"frequency": 2, "uif": 1, "uif-pmi": 0.5},
+    {"frequency": 1, "uif": 1},
+    {"frequency": 5, "uif": 3, "uif-pmi": -1.25}
+]
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("frequency >= 2", [True, False, True]),
+    ("frequency>=2", [True, False, True]),
+    ("uif-pmi > 0.25", [True, False, False]),
+    ("uif-pmi < 0", [False, False, True]),
+    ("uif-pmi == 0", [False, True, False]),
+    ("frequency >= 2 and uif < 2", [True, False, False]),
+    ("frequency == 1 or uif-pmi <= -1e0", [False, True, True]),
+    ("not frequency != 1", [False, True, False]),
+    ("uif == 1 and (frequency > 1 or uif-pmi == 0)", [True, True, False]),
+    ("not (frequency > 1 and uif > 1) and not frequency < 2", [True, False, False]),
+    ("unknown >= 1", [False, False, False])
+])
+def test_pattern_filter(expression, expected):
+
+    pattern_filter = PatternFilter(expression)
+    assert [pattern_filter(pattern_stats) for pattern_stats in stats] == expected
+
+    pattern_set = ColumnarPatternSet.from_jsonl(
+        '[' + str(index) + ', ' + str(pattern_stats).replace("'", '"') + ']'
+        for index, pattern_stats in enumerate(stats))
+    assert pattern_filter.evaluate_columnar(pattern_set).tolist() == expected
+
+
+def test_pattern_filter_features():
+
+    assert PatternFilter("uif >= 1 and (frequency > 2 or not uif < 3)").features == ["uif", "frequency"]
+    assert PatternFilter.from_threshold("uif-pmi", ">=", 0.5).features == ["uif-pmi"]
+
+
+@pytest.mark.parametrize("feature, op, threshold, expected", [
+    ("frequency", ">=", 2, [True, False, True]),
+    ("frequency", ">=", float('inf'), [False, False, False]),
+    ("uif-pmi", "<", float('-inf'), [False, False, False]),
+    ("and", "==", 0, [True, True, True]),
+    ("uif pmi (x)", "<", 1, [True, True, True])
+])
+def test_pattern_filter_from_threshold(feature, op, threshold, expected):
+
+    pattern_filter = PatternFilter.from_threshold(feature, op, threshold)
+    assert pattern_filter.features == [feature]
+    assert [pattern_filter(pattern_stats) for pattern_stats in stats] == expected
+
+    pattern_set = ColumnarPatternSet.from_jsonl(
+        '[' + str(index) + ', ' + str(pattern_stats).replace("'", '"') + ']'
+        for index, pattern_stats in enumerate(stats))
+    assert pattern_filter.evaluate_columnar(pattern_set).tolist() == expected
+
+
+@pytest.mark.parametrize("expression", [
+    "",
+    "frequency",
+    "frequency >= ",
+    "frequency => 2",
+    "2 <= frequency",
+    "frequency >= 2 and",
+    "(frequency >= 2",
+    "frequency >= 2)",
+    "frequency >= 2 uif >= 1",
+    "frequency >= 2 & uif >= 1"
+])
+def test_pattern_filter_invalid(expression):
+
+    with pytest.raises(ValueError):
+        PatternFilter(expression)
+
+
+def test_pattern_filter_columnar_not_numeric():
+
+    pattern_set = ColumnarPatternSet.from_jsonl([
+        '[0, {"frequency": 2, "pattern_profile": "a b"}]\n',
+        '[1, {"frequency": 1}]\n'])
+
+    assert PatternFilter("frequency >= 2").evaluate_columnar(pattern_set).tolist() == [True, False]
+    with pytest.raises(ValueError, match="pattern_profile"):
+        PatternFilter("pattern_profile > 0").evaluate_columnar(pattern_set)
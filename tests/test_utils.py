@@ -2,7 +2,7 @@ from unittest import mock
 
 import pytest
 
-from cxnminer.utils.helpers import open_file
+from cxnminer.utils.helpers import iter_join, iter_outer_join, open_file, sort_file, IdTable, SortedGroups, UnsortedError
 
 @mock.patch('builtins.open')
 def test_open_text_file(mockfunction):
@@ -36,3 +36,107 @@ def test_open_zipped_binary_file(mockfunction):
 
     open_file(filename, 'rb')
     mockfunction.assert_called_with(filename, 'rb')
+
+
+@pytest.mark.parametrize("outfile,processes,compress", [
+    ('sorted.txt', 0, False),
+    ('sorted.txt.gz', 0, True),
+    ('sorted.txt', 2, False)
+])
+def test_sort_file(tmp_path, outfile, processes, compress):
+
+    lines = ["b\tc", "a", "a\tb", "A", "_a", "ä", "a b", ",", "b\tc", ""]*20
+
+    infile = str(tmp_path / 'unsorted.txt')
+    outfile = str(tmp_path / outfile)
+    with open_file(infile, 'w') as o:
+        o.write("".join(line + "\n" for line in lines))
+
+    sort_file(infile, outfile, buffer_size=500, processes=processes, compress=compress)
+
+    with open_file(outfile) as i:
+        result = i.read()
+
+    assert result == "".join(line + "\n" for line in sorted(lines, key=lambda line: line.encode('utf-8')))
+
+
+@pytest.mark.parametrize("buffer_size,compress", [
+    (1024**2, False),
+    (0, False),
+    (200, True)
+])
+def test_sorted_groups(tmp_path, buffer_size, compress):
+
+    items = [("b", "2"), ("a", "3"), ("a b", "1"), ("b", "1"), ("ä", "1"), ("a", "1")]*5
+
+    with SortedGroups(buffer_size, tmpdir=str(tmp_path), compress=compress) as groups:
+        for key, value in items:
+            groups.add(key, value)
+
+        result = list(groups)
+
+    assert result == [
+        ("a", ["1"]*5 + ["3"]*5),
+        ("a b", ["1"]*5),
+        ("b", ["1"]*5 + ["2"]*5),
+        ("ä", ["1"]*5)
+    ]
+
+
+def test_id_table(tmp_path):
+
+    table = IdTable(["b", "a"])
+
+    assert table.intern("a") == 1
+    assert table.intern("c") == 2
+    assert table.get_id("d") is None
+    assert table[0] == "b"
+    assert table.resolve(2) == "c"
+    assert table.resolve("d") == "d"
+
+    filename = str(tmp_path / 'table.ids.gz')
+    table.save(filename)
+    loaded_table = IdTable.load(filename)
+
+    assert loaded_table.values == ["b", "a", "c"]
+    assert loaded_table.intern("c") == 2
+    assert loaded_table.intern("d") == 3
+
+
+@pytest.mark.parametrize("co_sorted", [True, False])
+def test_iter_join(co_sorted):
+
+    items = [("a", 1), ("c", 2), ("d", 3), ("f", 4)]
+    values = [("b", "x"), ("c", "y"), ("d", "z"), ("e", "w"), ("g", "v")]
+
+    assert list(iter_join(items, values, key=lambda item: item[0], co_sorted=co_sorted, default="-")) == [
+        (("a", 1), "-"), (("c", 2), "y"), (("d", 3), "z"), (("f", 4), "-")
+    ]
+
+    assert list(iter_join([], values, co_sorted=co_sorted)) == []
+    assert list(iter_join(["a", "c"], [], co_sorted=co_sorted)) == [("a", None), ("c", None)]
+    assert list(iter_join([0, 2, 10], [(2, "x"), (10, "y")], co_sorted=co_sorted)) == [(0, None), (2, "x"), (10, "y")]
+
+
+@pytest.mark.parametrize("items, values", [
+    (["a", "c", "b"], [("a", 1), ("b", 2), ("c", 3)]),
+    (["a", "b", "c"], [("a", 1), ("c", 3), ("b", 2)]),
+    (["a", "a"], [("a", 1)]),
+    (["a", "b"], [("a", 1), ("a", 2)])
+])
+def test_iter_join_unsorted(items, values):
+
+    with pytest.raises(UnsortedError):
+        list(iter_join(items, values))
+
+    assert [item for item, _ in iter_join(items, values, co_sorted=False)] == items
+
+
+def test_iter_outer_join():
+
+    assert list(iter_outer_join([("a", 1), ("c", 2)], [], [("b", 3), ("c", 4)])) == [
+        ("a", [1, None, None]), ("b", [None, None, 3]), ("c", [2, None, 4])
+    ]
+
+    with pytest.raises(UnsortedError):
+        list(iter_outer_join([("a", 1)], [("c", 2), ("b", 3)]))